@@ -3,4 +3,4 @@ Core module - config, security
 """
 
 from app.core.config import *  # noqa: F401, F403
-from app.core.security import verify_api_key, limiter  # noqa: F401
+from app.core.security import verify_api_key  # noqa: F401
@@ -10,20 +10,73 @@ WORKERS = int(os.getenv("WORKERS", 4))
 
 # Redis
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 1.0))  # connect/read timeout
+REDIS_BACKOFF = float(os.getenv("REDIS_BACKOFF", 2.0))  # first degraded window
+REDIS_BACKOFF_MAX = float(os.getenv("REDIS_BACKOFF_MAX", 60.0))
 
 # Cache TTL (seconds)
 CACHE_TTL_REGIONS = 3600  # 1 hour
 CACHE_TTL_MOVIES = 300  # 5 minutes
 CACHE_TTL_THEATERS = 600  # 10 minutes
 CACHE_TTL_SEARCH = 120  # 2 minutes
+CACHE_TTL_THEATERS_MAX = int(os.getenv("CACHE_TTL_THEATERS_MAX", 21600))  # venue lists
+
+# Adaptive TTLs: a refresh that finds a key unchanged stretches its TTL, one
+# that finds it changed shortens it, within [ttl * MIN_FACTOR, ttl * MAX_FACTOR]
+# (or a route's own bounds)
+CACHE_ADAPTIVE_TTL = os.getenv("CACHE_ADAPTIVE_TTL", "true").lower() == "true"
+CACHE_TTL_GROW = float(os.getenv("CACHE_TTL_GROW", 1.5))
+CACHE_TTL_SHRINK = float(os.getenv("CACHE_TTL_SHRINK", 0.5))
+CACHE_TTL_MIN_FACTOR = float(os.getenv("CACHE_TTL_MIN_FACTOR", 0.5))
+CACHE_TTL_MAX_FACTOR = float(os.getenv("CACHE_TTL_MAX_FACTOR", 4))
+
+# How long past its TTL a value may still be served while it is refreshed,
+# or while upstream is failing (seconds)
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", 1800))
+CACHE_STALE_TTL_REGIONS = int(os.getenv("CACHE_STALE_TTL_REGIONS", 86400))
+CACHE_REFRESH_RETRY = float(os.getenv("CACHE_REFRESH_RETRY", 10))  # after a failure
+# Upstream 404s and empty results (count 0) are cached this long instead
+CACHE_NEGATIVE_TTL = int(os.getenv("CACHE_NEGATIVE_TTL", 60))
+
+# In-process L1 cache (per worker)
+CACHE_L1_MAX_ITEMS = int(os.getenv("CACHE_L1_MAX_ITEMS", 1024))
+
+# Compressed copies of cached bodies, made once at write time
+CACHE_COMPRESS_MIN = int(os.getenv("CACHE_COMPRESS_MIN", 1024))  # bytes
+CACHE_GZIP_LEVEL = int(os.getenv("CACHE_GZIP_LEVEL", 6))
+CACHE_BROTLI_QUALITY = int(os.getenv("CACHE_BROTLI_QUALITY", 5))
+
+# Cache fill coalescing across workers
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", 15))  # max fill duration
+CACHE_LOCK_POLL = float(os.getenv("CACHE_LOCK_POLL", 0.05))  # waiter poll interval
+
+# Cache warmer (refreshes hot keys ahead of their TTL on one leader worker)
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "true").lower() == "true"
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", 30))
+WARMER_JITTER = float(os.getenv("WARMER_JITTER", 0.2))  # +/- fraction of interval
+WARMER_CONCURRENCY = int(os.getenv("WARMER_CONCURRENCY", 4))
+WARMER_REFRESH_AHEAD = float(os.getenv("WARMER_REFRESH_AHEAD", 0.8))  # of TTL
+WARMER_TOP_CITIES = int(os.getenv("WARMER_TOP_CITIES", 8))
+WARMER_HOT_KEYS = int(os.getenv("WARMER_HOT_KEYS", 32))  # seeded from traffic
+WARMER_REGIONS = [r for r in os.getenv("WARMER_REGIONS", "").split(",") if r]
 
 # Security
-API_KEYS = set(os.getenv("API_KEYS", "dev-key-123").split(","))
-RATE_LIMIT = os.getenv("RATE_LIMIT", "100/minute")
+# Admin keys may also profile requests (X-Profile); they are valid API keys too
+ADMIN_API_KEYS = {k for k in os.getenv("ADMIN_API_KEYS", "").split(",") if k}
+API_KEYS = set(os.getenv("API_KEYS", "dev-key-123").split(",")) | ADMIN_API_KEYS
+RATE_LIMIT = os.getenv("RATE_LIMIT", "100/minute")  # per API key, all workers
+# Per-key quotas, e.g. "partner-key=1000/minute,test-key=10/second"
+RATE_LIMITS = dict(
+    item.split("=", 1)
+    for item in os.getenv("RATE_LIMITS", "").split(",")
+    if "=" in item
+)
+RATE_LIMIT_LEASE = int(os.getenv("RATE_LIMIT_LEASE", 4))  # tokens a worker may hold
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", 1.0))  # seconds
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
 
 # BookMyShow
-BMS_BASE_URL = "https://in.bookmyshow.com"
+BMS_BASE_URL = os.getenv("BMS_BASE_URL", "https://in.bookmyshow.com")
 BMS_HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -41,3 +94,78 @@ BMS_HEADERS = {
     "sec-fetch-mode": "cors",
     "sec-fetch-site": "same-origin",
 }
+
+# Upstream HTTP client
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", 30))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 2))  # long-lived sessions per worker
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", 32))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 8))
+HTTP_IMPERSONATE = os.getenv("HTTP_IMPERSONATE", "chrome120")
+
+# Upstream circuit breaker (per endpoint family)
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", 30))  # seconds
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", 10))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", 30))  # before a probe
+
+# Adaptive upstream concurrency (AIMD, per endpoint family)
+UPSTREAM_LIMIT_INITIAL = int(os.getenv("UPSTREAM_LIMIT_INITIAL", 8))
+UPSTREAM_LIMIT_MIN = int(os.getenv("UPSTREAM_LIMIT_MIN", 1))
+UPSTREAM_LIMIT_MAX = int(os.getenv("UPSTREAM_LIMIT_MAX", HTTP_MAX_CONCURRENCY))
+UPSTREAM_LIMIT_BACKOFF = float(os.getenv("UPSTREAM_LIMIT_BACKOFF", 0.5))
+UPSTREAM_LIMIT_DECREASE_INTERVAL = 1.0  # seconds between decreases
+
+# POST /batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))  # misses fetched at once
+
+# List snapshots kept per cache key for ?since= deltas
+SNAPSHOT_HISTORY = int(os.getenv("SNAPSHOT_HISTORY", 32))  # versions
+SNAPSHOT_RETENTION = int(os.getenv("SNAPSHOT_RETENTION", 7 * 86400))  # seconds
+
+# Last-known-good store: cache entries and upstream bodies in a local SQLite
+# file, for cold starts without Redis data and outages of Redis and upstream
+STORE_PATH = os.getenv("STORE_PATH", "data/fdfs-store.sqlite3")  # "" disables it
+STORE_FLUSH_INTERVAL = float(os.getenv("STORE_FLUSH_INTERVAL", 1.0))  # seconds
+STORE_MAX_AGE = int(os.getenv("STORE_MAX_AGE", 7 * 86400))  # seconds a row is kept
+STORE_BUSY_TIMEOUT = float(os.getenv("STORE_BUSY_TIMEOUT", 5.0))  # seconds
+
+# Region resolution: codes, slugs, names, aliases and near misses of them
+REGION_VALIDATE = os.getenv("REGION_VALIDATE", "true").lower() == "true"  # 404 unknown
+REGION_FUZZY_MIN = float(os.getenv("REGION_FUZZY_MIN", 0.6))  # trigram similarity
+REGION_INDEX_REFRESH = float(os.getenv("REGION_INDEX_REFRESH", 60))  # seconds
+
+# Watchers (/watch): one poller per watched region refreshes its movie lists
+WATCH_ENABLED = os.getenv("WATCH_ENABLED", "true").lower() == "true"
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", 5))  # seconds between polls
+WATCH_CONCURRENCY = int(os.getenv("WATCH_CONCURRENCY", 4))  # regions polled at once
+WATCH_MAX_SUBSCRIBERS = int(os.getenv("WATCH_MAX_SUBSCRIBERS", 10000))  # per worker
+WATCH_QUEUE_SIZE = int(os.getenv("WATCH_QUEUE_SIZE", 100))  # events per subscriber
+WATCH_KEEPALIVE = float(os.getenv("WATCH_KEEPALIVE", 15))  # seconds
+
+# Local title suggestions (/search/suggest)
+SUGGEST_MAX_TITLES = int(os.getenv("SUGGEST_MAX_TITLES", 50000))  # per worker
+SUGGEST_FUZZY_MIN = float(os.getenv("SUGGEST_FUZZY_MIN", 0.4))  # trigram overlap
+SUGGEST_CONFIDENT = float(os.getenv("SUGGEST_CONFIDENT", 0.6))  # else ask upstream
+SUGGEST_UPSTREAM_MIN_CHARS = int(os.getenv("SUGGEST_UPSTREAM_MIN_CHARS", 3))
+SUGGEST_SYNC_INTERVAL = float(os.getenv("SUGGEST_SYNC_INTERVAL", 5))  # seconds
+
+# Nearby-theater search
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", 0.05))  # grid cell, ~5.5 km
+GEO_MAX_RADIUS_KM = float(os.getenv("GEO_MAX_RADIUS_KM", 50))
+GEO_MAX_REGIONS = int(os.getenv("GEO_MAX_REGIONS", 3))  # searched per query
+GEO_BOUNDS_REFRESH = float(os.getenv("GEO_BOUNDS_REFRESH", 60))  # seconds
+
+# CPU-bound parsing/shaping in a process pool (0 workers = always inline)
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", 0))
+CPU_POOL_THRESHOLD = int(os.getenv("CPU_POOL_THRESHOLD", 256 * 1024))  # bytes
+
+# Event loop lag monitor
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))  # seconds
+LOOP_LAG_WARN = float(os.getenv("LOOP_LAG_WARN", 0.1))  # log stalls above this
+
+# Request tracing
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"  # header
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 1.0))  # 0 = no log
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))  # sampling period
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", 200))  # in JSON profiles
@@ -0,0 +1,50 @@
+"""
+Per-request context shared between services and the ASGI layer.
+
+Services deep in the call stack (e.g. the cache) can attach response headers
+without the routes having to thread a Response object through.
+"""
+
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_response_headers: ContextVar[Optional[Dict[str, str]]] = ContextVar(
+    "response_headers", default=None
+)
+
+
+def set_response_header(name: str, value: str):
+    """Attach a header to the current request's response (no-op outside one)."""
+    headers = _response_headers.get()
+    if headers is not None:
+        headers[name] = value
+
+
+class ResponseHeadersMiddleware:
+    """Add headers set through set_response_header() to the outgoing response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers: Dict[str, str] = {}
+        token = _response_headers.set(headers)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and headers:
+                raw = list(message.get("headers", []))
+                raw.extend(
+                    (k.lower().encode("latin-1"), v.encode("latin-1"))
+                    for k, v in headers.items()
+                )
+                message["headers"] = raw
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _response_headers.reset(token)
@@ -0,0 +1,65 @@
+"""
+Event loop lag monitor.
+
+A background task sleeps for a fixed interval and measures how late it wakes
+up; the overshoot is how long the loop was busy with something else (parsing,
+serialization, ...). Recent samples are reported on /health and long stalls
+are logged. Each wake-up also flushes the batched metric counters (see
+``app.core.metrics.BatchedCounter``).
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Optional
+from app.core import config
+from app.core.metrics import LOOP_LAG_SECONDS, flush_counters
+
+logger = logging.getLogger(__name__)
+
+_SAMPLES = 120  # one minute at the default interval
+
+_samples: Deque[float] = deque(maxlen=_SAMPLES)
+_task: Optional[asyncio.Task] = None
+
+
+async def _run():
+    loop = asyncio.get_running_loop()
+    interval = config.LOOP_LAG_INTERVAL
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        _samples.append(lag)
+        LOOP_LAG_SECONDS.set(lag)
+        flush_counters()
+        if lag >= config.LOOP_LAG_WARN:
+            logger.warning("Event loop was blocked for %.0f ms", lag * 1000)
+
+
+def start_lag_monitor():
+    global _task
+    if _task is None:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_lag_monitor():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def lag_snapshot() -> dict:
+    """Recent event loop lag in milliseconds."""
+    if not _samples:
+        return {"last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0}
+    return {
+        "last_ms": round(_samples[-1] * 1000, 1),
+        "avg_ms": round(sum(_samples) / len(_samples) * 1000, 1),
+        "max_ms": round(max(_samples) * 1000, 1),
+    }
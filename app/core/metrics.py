@@ -0,0 +1,195 @@
+"""
+Prometheus metrics.
+
+Request and upstream latency, cache outcomes per key prefix, parse time and
+yield, CPU pool backlog and event loop lag, served on ``/metrics``.
+
+With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR (the deploy
+image does): each worker then records into files in that directory and any
+worker's ``/metrics`` reports the total. Without prometheus_client installed
+everything here is a no-op.
+"""
+
+import os
+import time
+from typing import List, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+except ImportError:  # optional: without it metrics are not collected
+    prometheus_client = None
+
+# Fast routes and cache hits live in the low buckets; upstream and parsing
+# the high ones.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200, 500)
+
+
+class _Noop:
+    """Stands in for a metric (or its labelled child) when metrics are off."""
+
+    def labels(self, *args, **kwargs) -> "_Noop":
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+
+if prometheus_client is not None:
+    REQUEST_SECONDS = Histogram(
+        "fdfs_request_duration_seconds",
+        "Time to serve an API request.",
+        ("route", "method", "status"),
+        buckets=LATENCY_BUCKETS,
+    )
+    UPSTREAM_SECONDS = Histogram(
+        "fdfs_upstream_request_duration_seconds",
+        "Upstream request time by endpoint family and status.",
+        ("family", "status"),
+        buckets=LATENCY_BUCKETS,
+    )
+    CACHE_LOOKUPS = Counter(
+        "fdfs_cache_lookups_total",
+        "Cached function lookups by key prefix and outcome.",
+        ("prefix", "result"),
+    )
+    PARSE_SECONDS = Histogram(
+        "fdfs_parse_seconds",
+        "Time spent parsing movie pages.",
+        ("mode",),
+        buckets=LATENCY_BUCKETS,
+    )
+    PARSE_MOVIES = Histogram(
+        "fdfs_parse_movies",
+        "Movies found per parsed page.",
+        ("mode",),
+        buckets=COUNT_BUCKETS,
+    )
+    CPU_POOL_PENDING = Gauge(
+        "fdfs_cpu_pool_pending",
+        "Jobs submitted to the CPU pool and not yet finished.",
+        multiprocess_mode="livesum",
+    )
+    LOOP_LAG_SECONDS = Gauge(
+        "fdfs_event_loop_lag_seconds",
+        "Latest event loop lag sample (worst worker).",
+        multiprocess_mode="livemax",
+    )
+else:
+    REQUEST_SECONDS = UPSTREAM_SECONDS = CACHE_LOOKUPS = _Noop()
+    PARSE_SECONDS = PARSE_MOVIES = CPU_POOL_PENDING = LOOP_LAG_SECONDS = _Noop()
+
+
+class BatchedCounter:
+    """A counter child for hot paths, incremented as a plain int.
+
+    A Prometheus increment takes a lock (and in multiprocess mode writes to
+    a file); this is an integer add. Counts reach Prometheus when
+    ``flush_counters`` runs: on every ``/metrics`` render, and from each
+    worker's lag monitor.
+    """
+
+    __slots__ = ("child", "pending")
+
+    def __init__(self, child):
+        self.child = child
+        self.pending = 0
+
+    def inc(self):
+        self.pending += 1
+
+    def flush(self):
+        pending, self.pending = self.pending, 0
+        if pending:
+            self.child.inc(pending)
+
+
+_batched: List[BatchedCounter] = []
+
+
+def batched(child) -> BatchedCounter:
+    """Wrap a labelled counter child for cheap increments."""
+    counter = BatchedCounter(child)
+    _batched.append(counter)
+    return counter
+
+
+def flush_counters():
+    for counter in _batched:
+        counter.flush()
+
+
+def render() -> Tuple[bytes, str]:
+    """The current metrics in the text exposition format: (body, content type)."""
+    flush_counters()
+    if prometheus_client is None:
+        return b"# prometheus_client is not installed\n", "text/plain; charset=utf-8"
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Record each request's latency under its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or prometheus_client is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                route.path if route is not None else "unmatched",
+                scope["method"],
+                str(status),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,235 @@
+"""
+Per-request phase timings.
+
+Code on the request path wraps its phases in ``span("name")`` (or reports a
+duration it measured itself with ``add_span``); the time spent is summed per
+phase name on the current request's trace. Each response carries the totals
+in a ``Server-Timing`` header, and requests slower than SLOW_REQUEST_SECONDS
+are logged with their breakdown.
+
+Work started during a request (a cache fill, a background refresh) records
+into that request's trace too, since tasks inherit the context. A request
+that only waited on a fill another request started sees that wait as
+``fill`` without its breakdown.
+
+An admin key can send ``X-Profile`` to get a sampling profile of the request
+back instead of its response; see ``app.core.profiler``.
+"""
+
+import logging
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import orjson
+from app.core import config
+from app.core.profiler import ProfilerBusy, SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Time spent per phase during one request: name -> [seconds, count]."""
+
+    __slots__ = ("started", "phases")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float):
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            phase[0] += seconds
+            phase[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def timings(self) -> Dict[str, float]:
+        """Milliseconds per phase, plus the total so far."""
+        timings = {name: round(s * 1000, 2) for name, (s, _) in self.phases.items()}
+        timings["total"] = round(self.elapsed() * 1000, 2)
+        return timings
+
+    def header(self) -> str:
+        """The phases as a Server-Timing header value."""
+        parts = []
+        for name, (seconds, count) in self.phases.items():
+            part = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                part += f';desc="{int(count)}x"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        """The phases for a log line, slowest first."""
+        phases = sorted(self.phases.items(), key=lambda item: -item[1][0])
+        return " ".join(
+            f"{name}={seconds * 1000:.1f}ms" + (f"({int(count)}x)" if count > 1 else "")
+            for name, (seconds, count) in phases
+        )
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def add_span(name: str, seconds: float):
+    """Record a phase duration measured by the caller (no-op outside a request)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+_NO_SPAN = nullcontext()
+
+
+def span(name: str):
+    """Time the enclosed block as a phase of the current request.
+
+    A plain class rather than a generator context manager: spans sit on hot
+    paths, and outside a request this is one ContextVar read.
+    """
+    trace = _trace.get()
+    return _NO_SPAN if trace is None else _Span(trace, name)
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value
+    return None
+
+
+class TracingMiddleware:
+    """Trace each request: Server-Timing header, slow log and opt-in profiles."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = _header(scope, b"x-profile")
+        if profile is not None:
+            await self._profile(scope, receive, send, profile.decode("latin-1"))
+            return
+
+        trace = Trace()
+        token = _trace.set(trace)
+        event_stream = False
+
+        async def send_with_timing(message):
+            nonlocal event_stream
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                event_stream = (b"content-type", b"text/event-stream") in [
+                    (k.lower(), v.split(b";")[0]) for k, v in headers
+                ]
+                if config.SERVER_TIMING:
+                    header = trace.header().encode("latin-1")
+                    headers.append((b"server-timing", header))
+                    message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _trace.reset(token)
+            # Event streams stay open by design; only their setup is timed.
+            if not event_stream:
+                self._log_if_slow(scope, trace)
+
+    def _log_if_slow(self, scope, trace: Trace):
+        elapsed = trace.elapsed()
+        if 0 < config.SLOW_REQUEST_SECONDS <= elapsed:
+            query = scope.get("query_string", b"").decode("latin-1")
+            logger.warning(
+                "Slow request %s %s%s took %.0f ms: %s",
+                scope["method"],
+                scope["path"],
+                f"?{query}" if query else "",
+                elapsed * 1000,
+                trace.summary() or "no phases recorded",
+            )
+
+    async def _profile(self, scope, receive, send, fmt: str):
+        """Run the request under the sampling profiler and send the profile back."""
+        api_key = _header(scope, b"x-api-key")
+        if api_key is None or api_key.decode("latin-1") not in config.ADMIN_API_KEYS:
+            await _send(send, 403, {"detail": "Profiling requires an admin API key."})
+            return
+
+        status = 500
+        trace = Trace()
+        token = _trace.set(trace)
+
+        async def swallow(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        try:
+            with SamplingProfiler(config.PROFILE_INTERVAL) as profiler:
+                await self.app(scope, receive, swallow)
+        except ProfilerBusy:
+            await _send(send, 409, {"detail": "A profile is already running."})
+            return
+        except Exception:
+            # Still worth returning: the profile shows where it failed.
+            logger.exception("Profiled request failed")
+            status = 500
+        finally:
+            _trace.reset(token)
+
+        if fmt.strip().lower() == "collapsed":
+            body = profiler.collapsed().encode()
+            await _send(send, 200, body, b"text/plain; charset=utf-8")
+            return
+        await _send(
+            send,
+            200,
+            {
+                "status": status,
+                "server_timing": trace.timings(),
+                "interval_ms": config.PROFILE_INTERVAL * 1000,
+                "samples": profiler.samples,
+                "stacks": profiler.top(config.PROFILE_MAX_STACKS),
+            },
+        )
+
+
+async def _send(send, status: int, body, content_type: bytes = b"application/json"):
+    if not isinstance(body, bytes):
+        body = orjson.dumps(body)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -3,24 +3,60 @@ BookMyShow Fast API - Main Application
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
 
 from app.core import config
-from app.core.security import limiter
-from app.services import close_client, close_pool, close_redis
-from app.routes import regions_router, search_router, theaters_router, movies_router
+from app.core.context import ResponseHeadersMiddleware
+from app.core.lag import lag_snapshot, start_lag_monitor, stop_lag_monitor
+from app.core.metrics import MetricsMiddleware, render as render_metrics
+from app.core.tracing import TracingMiddleware
+from app.services import breaker
+from app.services.cache import redis_degraded, refresh_stats
+from app.services.store import store_stats
+from app.services.watch import watch_stats
+from app.services import (
+    close_client,
+    close_pool,
+    close_redis,
+    close_store,
+    start_cache_listener,
+    start_pool,
+    start_region_index,
+    start_warmer,
+    start_watcher,
+    stop_region_index,
+    stop_warmer,
+    stop_watcher,
+)
+from app.routes import (
+    batch_router,
+    movies_router,
+    regions_router,
+    search_router,
+    theaters_router,
+    watch_router,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle."""
+    start_lag_monitor()
+    start_pool()
+    start_cache_listener()
+    start_region_index()
+    start_warmer()
+    start_watcher()
     yield
+    await stop_watcher()
+    await stop_warmer()
+    await stop_region_index()
+    await stop_lag_monitor()
     await close_client()
     await close_pool()
+    await close_store()
     await close_redis()
 
 
@@ -32,10 +68,6 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Rate limiting
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -43,13 +75,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Cache",
+        "Age",
+        "ETag",
+        "X-RateLimit-Limit",
+        "X-RateLimit-Remaining",
+        "Retry-After",
+        "Server-Timing",
+        "X-Version",
+        "X-Delta",
+    ],
 )
 
+# Headers set by services during a request (cache status, ...)
+app.add_middleware(ResponseHeadersMiddleware)
+
+# Server-Timing phases, slow request log and admin profiles
+app.add_middleware(TracingMiddleware)
+
+# Per-route latency histograms (outermost, so the whole request is timed)
+app.add_middleware(MetricsMiddleware)
+
 # Register routes
 app.include_router(regions_router)
 app.include_router(search_router)
 app.include_router(theaters_router)
 app.include_router(movies_router)
+app.include_router(batch_router)
+app.include_router(watch_router)
 
 
 @app.get("/", tags=["Health"])
@@ -59,4 +113,20 @@ async def health_check():
 
 @app.get("/health", tags=["Health"])
 async def detailed_health():
-    return {"status": "ok", "version": "1.0.0"}
+    return {
+        "status": "ok",
+        "version": "1.0.0",
+        "redis": "degraded" if redis_degraded() else "ok",
+        "upstream": breaker.snapshot(),
+        "refresh": refresh_stats(),
+        "event_loop_lag": lag_snapshot(),
+        "watch": watch_stats(),
+        "store": store_stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for every worker."""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
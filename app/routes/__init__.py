@@ -6,3 +6,5 @@ from app.routes.regions import router as regions_router  # noqa: F401
 from app.routes.search import router as search_router  # noqa: F401
 from app.routes.theaters import router as theaters_router  # noqa: F401
 from app.routes.movies import router as movies_router  # noqa: F401
+from app.routes.batch import router as batch_router  # noqa: F401
+from app.routes.watch import router as watch_router  # noqa: F401
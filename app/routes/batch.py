@@ -0,0 +1,137 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.services.ratelimit import charge, rate_limit
+from app.core import config
+from app.services import cache
+from app.routes.movies import _fetch_now_showing, _fetch_upcoming
+from app.routes.regions import _fetch_regions
+from app.routes.search import _search_movies
+from app.routes.theaters import _fetch_theaters
+
+router = APIRouter(tags=["Batch"])
+
+# resource -> (cached function, {query parameter: function argument})
+RESOURCES: Dict[str, Tuple[Callable, Dict[str, str]]] = {
+    "regions": (_fetch_regions, {}),
+    "now-showing": (_fetch_now_showing, {"region": "region"}),
+    "upcoming": (_fetch_upcoming, {"region": "region"}),
+    "theaters": (_fetch_theaters, {"region": "region"}),
+    "search": (_search_movies, {"q": "query"}),
+}
+
+
+class SubRequest(BaseModel):
+    resource: str
+    params: Dict[str, str] = {}
+    id: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest]
+
+
+def _line(index: int, item: SubRequest, status: int, **fields) -> dict:
+    line = {"index": index, "resource": item.resource, "status": status}
+    if item.id is not None:
+        line["id"] = item.id
+    line.update(fields)
+    return line
+
+
+def _encode(line: dict, body: Optional[bytes] = None) -> bytes:
+    """One NDJSON line; body is spliced in as ``data`` without re-encoding."""
+    if body is None:
+        return orjson.dumps(line) + b"\n"
+    return orjson.dumps(line)[:-1] + b',"data":' + body + b"}\n"
+
+
+def _resolve(item: SubRequest) -> Tuple[Callable, dict, str]:
+    """The cached function, its kwargs and its cache key for a sub-request.
+
+    Raises for an unknown resource or parameter value (e.g. region).
+    """
+    if item.resource not in RESOURCES:
+        raise HTTPException(status_code=400, detail="Unknown resource")
+    func, params = RESOURCES[item.resource]
+    missing = [name for name in params if not item.params.get(name)]
+    if missing:
+        raise HTTPException(
+            status_code=400, detail=f"Missing parameter: {', '.join(missing)}"
+        )
+    kwargs = {arg: item.params[name] for name, arg in params.items()}
+    return func, kwargs, func.cache_key(**kwargs)
+
+
+async def _results(items: List[SubRequest]) -> AsyncIterator[bytes]:
+    """Yield each sub-request's result line as soon as it is ready."""
+    calls: List[Optional[Tuple[Callable, dict, str]]] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, item in enumerate(items):
+        try:
+            calls.append(_resolve(item))
+        except HTTPException as e:
+            calls.append(None)
+            queue.put_nowait(_encode(_line(i, item, e.status_code, error=e.detail)))
+
+    # Everything already cached comes out of one pipelined round trip.
+    found = await cache.prefetch([call[2] for call in filter(None, calls)])
+    semaphore = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+
+    async def run(i: int, func: Callable, kwargs: dict, key: str):
+        item = items[i]
+        try:
+            hit = found.get(key)
+            if hit is not None:
+                entry = await func.entry(**kwargs)
+                status = "HIT" if hit.fresh else "STALE"
+            else:
+                async with semaphore:
+                    entry = await func.entry(**kwargs)
+                status = "MISS" if entry.fresh else "STALE"
+            line = _line(i, item, 200, cache=status, age=int(entry.age))
+            queue.put_nowait(_encode(line, entry.body))
+        except HTTPException as e:
+            queue.put_nowait(_encode(_line(i, item, e.status_code, error=e.detail)))
+        except Exception:
+            queue.put_nowait(_encode(_line(i, item, 500, error="Internal error")))
+
+    tasks = [
+        asyncio.ensure_future(run(i, *call))
+        for i, call in enumerate(calls)
+        if call is not None
+    ]
+    try:
+        for _ in range(len(items)):
+            yield await queue.get()
+    finally:
+        # The client may have gone away mid-stream.
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/batch")
+async def batch(
+    request: Request,
+    body: BatchRequest,
+    api_key: str = Depends(rate_limit),
+):
+    """Fetch several resources in one call, streamed back as NDJSON.
+
+    Each line is one sub-request's result, in completion order; ``index``
+    refers back to its position in the request. Every sub-request counts
+    against the rate limit.
+    """
+    if not body.requests:
+        raise HTTPException(status_code=400, detail="No requests")
+    if len(body.requests) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.BATCH_MAX_ITEMS} requests per batch",
+        )
+    # Each sub-request counts against the quota; the dependency charged one.
+    await charge(api_key, len(body.requests) - 1)
+    return StreamingResponse(_results(body.requests), media_type="application/x-ndjson")
@@ -1,39 +1,53 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, Query, Request
-from app.core.security import verify_api_key, limiter
+from app.services.ratelimit import rate_limit
 from app.core import config
-from app.services.scraper import scrape_movies_page, parse_movies_from_html
+from app.services.scraper import scrape_movies
 from app.services.cache import cached
+from app.services import regions, snapshots, suggest, warmer, watch
 
 router = APIRouter(tags=["Movies"])
 
 
 @router.get("/now-showing")
-@limiter.limit(config.RATE_LIMIT)
 async def get_now_showing(
     request: Request,
-    region: str = Query(..., description="Region slug (e.g., hyderabad, mumbai)"),
-    api_key: str = Depends(verify_api_key),
+    region: str = Query(
+        ..., description="Region slug, code or name (e.g., hyderabad, HYD, Bombay)"
+    ),
+    since: Optional[int] = Query(
+        None, description="Version the client has (X-Version); returns only changes"
+    ),
+    api_key: str = Depends(rate_limit),
 ):
     """Get currently showing movies in a region."""
-    return await _fetch_now_showing(region=region)
+    return await snapshots.respond(
+        _fetch_now_showing, request, since, "movies", "id", region=region
+    )
 
 
 @router.get("/upcoming")
-@limiter.limit(config.RATE_LIMIT)
 async def get_upcoming(
     request: Request,
-    region: str = Query(..., description="Region slug (e.g., hyderabad, mumbai)"),
-    api_key: str = Depends(verify_api_key),
+    region: str = Query(
+        ..., description="Region slug, code or name (e.g., hyderabad, HYD, Bombay)"
+    ),
+    since: Optional[int] = Query(
+        None, description="Version the client has (X-Version); returns only changes"
+    ),
+    api_key: str = Depends(rate_limit),
 ):
     """Get upcoming movies in a region."""
-    return await _fetch_upcoming(region=region)
+    return await snapshots.respond(
+        _fetch_upcoming, request, since, "movies", "id", region=region
+    )
 
 
-@cached("now_showing", ttl=config.CACHE_TTL_MOVIES)
+@cached("now_showing", ttl=config.CACHE_TTL_MOVIES, normalize={"region": regions.slug})
 async def _fetch_now_showing(region: str):
     url = f"{config.BMS_BASE_URL}/explore/movies-{region}"
-    html = await scrape_movies_page(url)
-    movies = parse_movies_from_html(html, "now_showing")
+    movies = await scrape_movies(url, "now_showing")
+    await suggest.add_movies(movies, overwrite=False)
     return {
         "movies": movies,
         "count": len(movies),
@@ -42,14 +56,20 @@ async def _fetch_now_showing(region: str):
     }
 
 
-@cached("upcoming", ttl=config.CACHE_TTL_MOVIES)
+@cached("upcoming", ttl=config.CACHE_TTL_MOVIES, normalize={"region": regions.slug})
 async def _fetch_upcoming(region: str):
     url = f"{config.BMS_BASE_URL}/explore/upcoming-movies-{region}"
-    html = await scrape_movies_page(url)
-    movies = parse_movies_from_html(html, "upcoming")
+    movies = await scrape_movies(url, "upcoming")
+    await suggest.add_movies(movies, overwrite=False)
     return {
         "movies": movies,
         "count": len(movies),
         "region": region,
         "type": "upcoming",
     }
+
+
+warmer.register(_fetch_now_showing, region_field="slug")
+warmer.register(_fetch_upcoming, region_field="slug")
+watch.register(_fetch_now_showing)
+watch.register(_fetch_upcoming)
@@ -1,20 +1,25 @@
 from fastapi import APIRouter, Depends, Request
-from app.core.security import verify_api_key, limiter
+from app.services.ratelimit import rate_limit
 from app.core import config
 from app.services.http_client import fetch_json
 from app.services.cache import cached
+from app.services import regions, warmer
 
 router = APIRouter(tags=["Regions"])
 
 
 @router.get("/regions")
-@limiter.limit(config.RATE_LIMIT)
-async def get_regions(request: Request, api_key: str = Depends(verify_api_key)):
+async def get_regions(request: Request, api_key: str = Depends(rate_limit)):
     """Get all available regions and cities."""
-    return await _fetch_regions()
+    return await _fetch_regions.response(request)
 
 
-@cached("regions", ttl=config.CACHE_TTL_REGIONS)
+@cached(
+    "regions",
+    ttl=config.CACHE_TTL_REGIONS,
+    stale_ttl=config.CACHE_STALE_TTL_REGIONS,
+    pin=True,
+)
 async def _fetch_regions():
     url = f"{config.BMS_BASE_URL}/api/explore/v1/discover/regions"
     data = await fetch_json(url)
@@ -41,3 +46,7 @@ async def _fetch_regions():
             )
 
     return {"regions": regions, "count": len(regions)}
+
+
+warmer.register_region_source(_fetch_regions)
+regions.register_source(_fetch_regions)
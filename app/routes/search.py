@@ -1,30 +1,70 @@
-from fastapi import APIRouter, Depends, Query, Request
-from app.core.security import verify_api_key, limiter
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.services.ratelimit import rate_limit
 from app.core import config
 from app.services.http_client import fetch_json
 from app.services.cache import cached
+from app.services import keys, suggest
 from urllib.parse import quote
 
 router = APIRouter(tags=["Search"])
 
 
 @router.get("/search")
-@limiter.limit(config.RATE_LIMIT)
 async def search_movies(
     request: Request,
     q: str = Query(..., min_length=1, description="Search query"),
-    api_key: str = Depends(verify_api_key),
+    api_key: str = Depends(rate_limit),
 ):
     """Search for movies by name."""
-    return await _search_movies(query=q)
+    return await _search_movies.response(request, query=q)
 
 
-@cached("search", ttl=config.CACHE_TTL_SEARCH)
+@router.get("/search/suggest")
+async def suggest_movies(
+    request: Request,
+    q: str = Query(..., min_length=1, description="What the user has typed so far"),
+    limit: int = Query(8, ge=1, le=25, description="Maximum suggestions"),
+    api_key: str = Depends(rate_limit),
+):
+    """Suggest movie titles as the user types, from the local index when possible."""
+    query = keys.query(q)
+    found, confident = await suggest.lookup(query, limit)
+    movies = [doc for _, doc in found]
+    source = "local"
+
+    if not confident and len(query) >= config.SUGGEST_UPSTREAM_MIN_CHARS:
+        try:
+            upstream = (await _search_movies(query=query))["movies"]
+        except HTTPException:
+            upstream = []  # keep whatever the index had
+        if upstream:
+            await suggest.add_movies(upstream)
+            docs = [d for d in map(suggest.as_doc, upstream) if d is not None]
+            ids = {d["id"] for d in docs}
+            movies = (docs + [d for d in movies if d["id"] not in ids])[:limit]
+            source = "upstream"
+
+    return {
+        "suggestions": movies,
+        "count": len(movies),
+        "query": query,
+        "source": source,
+    }
+
+
+@cached("search", ttl=config.CACHE_TTL_SEARCH, normalize={"query": keys.query})
 async def _search_movies(query: str):
     encoded_query = quote(query)
     url = f"{config.BMS_BASE_URL}/quickbook-search.bms?cat=MT&q={encoded_query}"
 
     data = await fetch_json(url)
+    result = _map_hits(data, query)
+    await suggest.add_movies(result["movies"])
+    return result
+
+
+def _map_hits(data: dict, query: str) -> dict:
+    """Build the search response from quickbook-search hits."""
     movies = []
 
     for item in data.get("hits", []):
@@ -1,28 +1,86 @@
-from fastapi import APIRouter, Depends, Query, Request
-from app.core.security import verify_api_key, limiter
+from typing import Optional
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.services.ratelimit import rate_limit
 from app.core import config
-from app.services.http_client import fetch_json
+from app.services.http_client import fetch_bytes
+from app.services.offload import offload
 from app.services.cache import cached
+from app.services import geo, regions, snapshots, warmer
 
 router = APIRouter(tags=["Theaters"])
 
 
 @router.get("/theaters")
-@limiter.limit(config.RATE_LIMIT)
 async def get_theaters(
     request: Request,
-    region: str = Query(..., description="Region code (e.g., HYD, MUMBAI)"),
-    api_key: str = Depends(verify_api_key),
+    region: str = Query(
+        ..., description="Region code, slug or name (e.g., HYD, mumbai, Bangalore)"
+    ),
+    since: Optional[int] = Query(
+        None, description="Version the client has (X-Version); returns only changes"
+    ),
+    api_key: str = Depends(rate_limit),
 ):
     """Get all theaters/cinemas in a region."""
-    return await _fetch_theaters(region=region)
+    return await snapshots.respond(
+        _fetch_theaters, request, since, "theaters", "code", region=region
+    )
 
 
-@cached("theaters", ttl=config.CACHE_TTL_THEATERS)
+@router.get("/theaters/nearby")
+async def get_nearby_theaters(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    radius: float = Query(
+        5.0, gt=0, le=config.GEO_MAX_RADIUS_KM, description="Radius in km"
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Maximum theaters"),
+    region: Optional[str] = Query(
+        None, description="Region to search (default: regions near the point)"
+    ),
+    api_key: str = Depends(rate_limit),
+):
+    """Get theaters near a location, nearest first."""
+    if region is not None:
+        region = regions.code(region)
+    searched, found = await geo.nearby(
+        lat, lon, radius, limit, _fetch_theaters.entry, region
+    )
+    theaters = [
+        {**theater, "distance_km": round(distance, 3)} for distance, theater in found
+    ]
+    return {
+        "theaters": theaters,
+        "count": len(theaters),
+        "regions": searched,
+        "lat": lat,
+        "lon": lon,
+        "radius_km": radius,
+    }
+
+
+@cached(
+    "theaters",
+    ttl=config.CACHE_TTL_THEATERS,
+    max_ttl=config.CACHE_TTL_THEATERS_MAX,
+    normalize={"region": regions.code},
+)
 async def _fetch_theaters(region: str):
     url = f"{config.BMS_BASE_URL}/api/v2/mobile/venues"
-    data = await fetch_json(url, params={"regionCode": region, "eventType": "MT"})
+    raw = await fetch_bytes(url, params={"regionCode": region, "eventType": "MT"})
+    try:
+        result = await offload(_shape_theaters, raw, region)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=503, detail=f"Request failed: {str(e)}")
+    await geo.record_bounds(region, result["theaters"])
+    return result
 
+
+def _shape_theaters(raw: bytes, region: str) -> dict:
+    """Build the theaters response from the raw venues payload."""
+    data = orjson.loads(raw)
     theaters = []
     for venue in data.get("venues", []):
         venue_code = venue.get("VenueCode", "")
@@ -62,3 +120,6 @@ async def _fetch_theaters(region: str):
         )
 
     return {"theaters": theaters, "count": len(theaters), "region": region}
+
+
+warmer.register(_fetch_theaters, region_field="code")
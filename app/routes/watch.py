@@ -0,0 +1,120 @@
+import asyncio
+from typing import AsyncIterator, List
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.requests import HTTPConnection
+from starlette.websockets import WebSocketDisconnect
+from app.core import config
+from app.core.security import verify_api_key
+from app.services import watch
+from app.services.ratelimit import charge
+
+router = APIRouter(tags=["Watch"])
+
+
+async def _authorize(conn: HTTPConnection) -> str:
+    """Check and charge the API key for a stream (one request each).
+
+    The key may also be passed as ``api_key`` in the query string, for clients
+    like EventSource and browser WebSockets that can't set headers.
+    """
+    api_key = conn.headers.get("X-API-Key") or conn.query_params.get("api_key")
+    api_key = await verify_api_key(api_key)
+    await charge(api_key)
+    return api_key
+
+
+async def _open(region: str, movies: List[str]):
+    """Subscribe and take the snapshot that starts the stream."""
+    subscription = watch.subscribe(region, movies)
+    try:
+        return subscription, await watch.snapshot(subscription)
+    except BaseException:
+        watch.unsubscribe(subscription)
+        raise
+
+
+def _sse(event: dict) -> bytes:
+    return (
+        b"event: "
+        + event["event"].encode()
+        + b"\ndata: "
+        + orjson.dumps(event)
+        + b"\n\n"
+    )
+
+
+async def _sse_stream(subscription, first: dict) -> AsyncIterator[bytes]:
+    try:
+        yield _sse(first)
+        while not subscription.dropped:
+            event = await subscription.next(config.WATCH_KEEPALIVE)
+            yield b": keepalive\n\n" if event is None else _sse(event)
+        yield _sse({"event": "reset", "region": subscription.region})
+    finally:
+        watch.unsubscribe(subscription)
+
+
+@router.get("/watch")
+async def watch_events(
+    request: Request,
+    region: str = Query(..., description="Region slug (e.g., hyderabad)"),
+    movie: List[str] = Query([], description="Movie ids or slugs (default: all)"),
+):
+    """Stream list changes for a region as server-sent events.
+
+    Starts with a ``snapshot`` of the watched movies in each list, then sends
+    ``added``/``removed`` as movies appear in or leave a list (a movie moving
+    to ``now_showing`` is booking opening). ``reset`` means the client fell
+    behind and should reconnect.
+    """
+    await _authorize(request)
+    subscription, first = await _open(region, movie)
+    return StreamingResponse(
+        _sse_stream(subscription, first),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/watch/ws")
+async def watch_socket(
+    websocket: WebSocket,
+    region: str = Query(...),
+    movie: List[str] = Query([]),
+):
+    """The same events as ``/watch``, one JSON message each, over a WebSocket."""
+    try:
+        await _authorize(websocket)
+        subscription, first = await _open(region, movie)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    async def drain():
+        # Nothing is expected from the client; this notices it going away.
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    await websocket.accept()
+    reader = asyncio.ensure_future(drain())
+    try:
+        await websocket.send_text(orjson.dumps(first).decode())
+        while not subscription.dropped and not reader.done():
+            event = await subscription.next(config.WATCH_KEEPALIVE)
+            if event is not None:
+                await websocket.send_text(orjson.dumps(event).decode())
+        if subscription.dropped:
+            reset = {"event": "reset", "region": subscription.region}
+            await websocket.send_text(orjson.dumps(reset).decode())
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        watch.unsubscribe(subscription)
+        try:
+            await reader
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
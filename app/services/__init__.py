@@ -4,12 +4,22 @@ Services module - HTTP client, scraper, cache
 
 from app.services.http_client import (  # noqa: F401
     fetch_json,
-    fetch_html,
+    fetch_bytes,
+    stream_html,
     close_client,
 )
 from app.services.scraper import (  # noqa: F401
-    scrape_movies_page,
+    scrape_movies,
     parse_movies_from_html,
-    close_pool,
+    MovieParser,
 )
-from app.services.cache import cached, close_redis  # noqa: F401
+from app.services.offload import start_pool, close_pool  # noqa: F401
+from app.services.cache import (  # noqa: F401
+    cached,
+    close_redis,
+    start_cache_listener,
+)
+from app.services.store import close_store  # noqa: F401
+from app.services.regions import start_region_index, stop_region_index  # noqa: F401
+from app.services.warmer import start_warmer, stop_warmer  # noqa: F401
+from app.services.watch import start_watcher, stop_watcher  # noqa: F401
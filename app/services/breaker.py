@@ -0,0 +1,209 @@
+"""
+Upstream protection: a circuit breaker and an adaptive (AIMD) concurrency
+limit per BookMyShow endpoint family.
+
+Throttling responses (403/429/5xx) and timeouts count as failures. Too many
+failures in the window open the circuit so callers fail fast (and cached
+routes fall back to stale data); after a cooldown a single probe decides
+whether to close it again. Independently, each family's concurrency limit
+halves on throttling and grows by roughly one per round trip on success.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from app.core import config
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+FAMILIES = (
+    ("/api/explore/v1/discover/regions", "regions"),
+    ("/api/v2/mobile/venues", "venues"),
+    ("/quickbook-search.bms", "search"),
+    ("/explore/", "explore"),
+)
+
+
+def family_for(url: str) -> str:
+    """Map an upstream URL to its endpoint family."""
+    for marker, family in FAMILIES:
+        if marker in url:
+            return family
+    return "other"
+
+
+def is_throttled(status_code: int) -> bool:
+    return status_code in (403, 429) or status_code >= 500
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding time window."""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._events: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._probing = False
+
+    def _trim(self, now: float):
+        while self._events and now - self._events[0][0] > config.BREAKER_WINDOW:
+            _, failed = self._events.popleft()
+            self._failures -= failed
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < config.BREAKER_COOLDOWN:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record(self, failed: Optional[bool]):
+        """Record an outcome; None means the call ended without a verdict."""
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if failed is None:
+                return
+            if failed:
+                self._open(now)
+            else:
+                self.state = CLOSED
+                self._events.clear()
+                self._failures = 0
+            return
+        if failed is None:
+            return
+
+        self._events.append((now, failed))
+        self._failures += failed
+        self._trim(now)
+        total = len(self._events)
+        if (
+            total >= config.BREAKER_MIN_REQUESTS
+            and self._failures / total >= config.BREAKER_FAILURE_RATE
+        ):
+            self._open(now)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self._events.clear()
+        self._failures = 0
+
+    def failure_rate(self) -> float:
+        self._trim(time.monotonic())
+        return self._failures / len(self._events) if self._events else 0.0
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with additive increase / multiplicative decrease."""
+
+    def __init__(self):
+        self.limit = float(config.UPSTREAM_LIMIT_INITIAL)
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed to us as we were cancelled
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def on_success(self):
+        self.limit = min(
+            float(config.UPSTREAM_LIMIT_MAX), self.limit + 1.0 / self.limit
+        )
+        self._wake()
+
+    def on_throttle(self):
+        # One decrease per congestion event, not one per failed in-flight call.
+        now = time.monotonic()
+        if now - self._last_decrease < config.UPSTREAM_LIMIT_DECREASE_INTERVAL:
+            return
+        self._last_decrease = now
+        self.limit = max(
+            float(config.UPSTREAM_LIMIT_MIN), self.limit * config.UPSTREAM_LIMIT_BACKOFF
+        )
+
+
+class UpstreamGuard:
+    """Breaker and limiter for one endpoint family."""
+
+    def __init__(self, family: str):
+        self.family = family
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveLimiter()
+        self.rejected = 0
+
+    async def start(self) -> bool:
+        """Take a slot for one call. False means fail fast: the circuit is open."""
+        if not self.breaker.allow():
+            self.rejected += 1
+            return False
+        try:
+            await self.limiter.acquire()
+        except asyncio.CancelledError:
+            self.breaker.record(None)
+            raise
+        return True
+
+    def finish(self, failed: Optional[bool]):
+        self.limiter.release()
+        self.breaker.record(failed)
+        if failed:
+            self.limiter.on_throttle()
+        elif failed is not None:
+            self.limiter.on_success()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "failure_rate": round(self.breaker.failure_rate(), 3),
+            "limit": int(self.limiter.limit),
+            "inflight": self.limiter.inflight,
+            "queued": len(self.limiter._waiters),
+            "rejected": self.rejected,
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+
+
+def guard_for(url: str) -> UpstreamGuard:
+    family = family_for(url)
+    guard = _guards.get(family)
+    if guard is None:
+        guard = _guards[family] = UpstreamGuard(family)
+    return guard
+
+
+def snapshot() -> Dict[str, dict]:
+    """Breaker state and current limits per family, for operators."""
+    return {family: guard.snapshot() for family, guard in _guards.items()}
@@ -1,66 +1,990 @@
 """
-Redis cache service.
+Two-tier cache: a per-worker in-memory LRU (L1) in front of Redis (L2).
+
+Entries carry a soft TTL and a longer hard TTL. Past the soft TTL the stale
+value is served while one background task refreshes it, and it keeps being
+served if upstream fails, until the hard TTL expires.
+
+Workers keep their L1 coherent through Redis pub/sub invalidation. When Redis
+fails, it is skipped for a growing backoff window instead of costing every
+request a failed connection attempt.
+
+Misses are coalesced: concurrent callers in one worker share a single in-flight
+fill, and a short Redis lock lets one worker fetch while the others wait for
+the value to land.
+
+Values are stored as their final JSON bytes, plus gzip and brotli variants
+made once at write time, so routes can serve hits without decoding anything.
+
+Every write also goes to the last-known-good store on local disk (see
+``app.services.store``). A key missing from both tiers is looked up there
+before going upstream, so a restart after Redis lost its data, or a worker
+running while Redis is down, starts warm; and when upstream fails for a key
+with nothing cached at all, the stored copy is served as stale, however old.
+
+Failures are cached too, briefly: an upstream 404 is stored as a negative
+entry that re-raises the 404 for CACHE_NEGATIVE_TTL seconds, and an empty
+result (``count`` 0) is kept only that long, so repeated requests for
+something that doesn't exist don't each go upstream.
+
+TTLs adapt per key: each refresh that finds the value unchanged stretches the
+key's TTL and each change shortens it, within bounds, so slow-moving data
+(venue lists) stops being re-fetched every few minutes while fast-moving data
+(Friday-morning listings) stays fresh. Keys are built from canonicalized
+arguments so trivially different requests share one entry.
 """
 
+import asyncio
+import gzip
+import hashlib
+import logging
+import time
+import uuid
+from collections import Counter, OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
 import redis.asyncio as redis
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict, List, Tuple
 from functools import wraps
 import orjson
+from fastapi import HTTPException, Request, Response
 from app.core import config
+from app.core.context import set_response_header
+from app.core.metrics import CACHE_LOOKUPS, batched
+from app.core.tracing import span
+from app.services import store
+from app.services.http_client import UpstreamUnchanged, fetched, revalidating
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "fdfs:cache:invalidate"
 
 _redis: Optional[redis.Redis] = None
+_inflight: Dict[str, asyncio.Task] = {}
+_listener: Optional[asyncio.Task] = None
+_worker_id = uuid.uuid4().hex[:12]
+_refresh_failed: Dict[str, float] = {}  # key -> monotonic time to retry refresh
+_access_counts: Counter = Counter()  # key -> reads since last drain
+_counting_access = False  # only while someone drains them (the warmer)
+_MAX_COUNTED_KEYS = 10000  # distinct keys counted between drains
+_refresh_stats: Counter = Counter()  # refreshes, and why some were no-ops
+_MISSING = object()
+_EMPTY_MAX_BYTES = 512
+
+# key -> (expires_at, entry, pinned)
+_l1: "OrderedDict[str, Tuple[float, CacheEntry, bool]]" = OrderedDict()
+
+# Degraded mode: skip Redis until _down_until after a failure.
+_down_until = 0.0
+_backoff = 0.0
+
+# Delete the lock only if we still own it.
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Take a lease if it is free, or extend it if we already hold it.
+_HOLD_LEASE = """
+local holder = redis.call('get', KEYS[1])
+if not holder then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+if holder == ARGV[1] then
+    redis.call('pexpire', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
 
 
 async def get_redis() -> redis.Redis:
     global _redis
     if _redis is None:
         _redis = redis.from_url(
-            config.REDIS_URL, encoding="utf-8", decode_responses=False
+            config.REDIS_URL,
+            encoding="utf-8",
+            decode_responses=False,
+            socket_connect_timeout=config.REDIS_TIMEOUT,
+            socket_timeout=config.REDIS_TIMEOUT,
         )
     return _redis
 
 
 async def close_redis():
-    global _redis
+    global _redis, _listener
+    if _listener:
+        _listener.cancel()
+        _listener = None
     if _redis:
         await _redis.close()
         _redis = None
 
 
-async def get_cached(key: str) -> Optional[Any]:
+async def available_redis() -> Optional[redis.Redis]:
+    """Return the client, or None while Redis is in a failure backoff window.
+
+    Callers outside this module should treat errors as best-effort misses.
+    """
+    if _down_until and time.monotonic() < _down_until:
+        return None
+    return await get_redis()
+
+
+def _mark_down():
+    global _down_until, _backoff
+    _backoff = (
+        min(_backoff * 2, config.REDIS_BACKOFF_MAX)
+        if _backoff
+        else config.REDIS_BACKOFF
+    )
+    _down_until = time.monotonic() + _backoff
+
+
+def _mark_up():
+    global _down_until, _backoff
+    _down_until = _backoff = 0.0
+
+
+def redis_degraded() -> bool:
+    """True while Redis is being skipped after a failure."""
+    return time.monotonic() < _down_until
+
+
+class CacheEntry:
+    """A cached JSON body plus the metadata needed to judge its freshness.
+
+    Fresh until ``ttl`` (soft TTL); after that it may still be served as stale
+    until ``hard_ttl`` while a refresh runs or upstream is failing. ``gzip``
+    and ``br`` hold compressed copies of the body (empty when not worth it);
+    ``etag`` is a hash of the body. ``version`` increases each time the body
+    changes (epoch milliseconds of the change) and is kept by renewals.
+    A nonzero ``negative`` is the HTTP status of a cached upstream failure,
+    whose body is the error detail. ``upstream`` holds the validators and
+    body hashes of the upstream responses the value was built from, per URL,
+    for revalidating it.
+    """
+
+    __slots__ = (
+        "body",
+        "stored_at",
+        "ttl",
+        "hard_ttl",
+        "gzip",
+        "br",
+        "etag",
+        "version",
+        "negative",
+        "upstream",
+        "_value",
+    )
+
+    def __init__(
+        self,
+        body: bytes,
+        stored_at: float,
+        ttl: int,
+        hard_ttl: int,
+        gzip: bytes = b"",
+        br: bytes = b"",
+        etag: str = "",
+        version: int = 0,
+        negative: int = 0,
+        upstream: Optional[dict] = None,
+    ):
+        self.body = body
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.hard_ttl = hard_ttl
+        self.gzip = gzip
+        self.br = br
+        self.etag = etag or hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.version = version or int(stored_at * 1000)
+        self.negative = negative
+        self.upstream = upstream or {}
+        self._value = _MISSING
+
+    @classmethod
+    def create(cls, value: Any, ttl: int, hard_ttl: int) -> "CacheEntry":
+        body = orjson.dumps(value)
+        gz = br = b""
+        if len(body) >= config.CACHE_COMPRESS_MIN:
+            gz = gzip.compress(body, config.CACHE_GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                br = brotli.compress(body, quality=config.CACHE_BROTLI_QUALITY)
+        entry = cls(body, time.time(), ttl, hard_ttl, gz, br)
+        entry._value = value
+        return entry
+
+    @classmethod
+    def failure(cls, status: int, detail: Any, ttl: int) -> "CacheEntry":
+        """A negative entry: upstream answered status, re-raised until ttl passes."""
+        return cls(
+            orjson.dumps({"detail": detail}), time.time(), ttl, ttl, negative=status
+        )
+
+    def error(self) -> HTTPException:
+        """The failure a negative entry stands for."""
+        return HTTPException(status_code=self.negative, detail=self.value["detail"])
+
+    def renewed(self, ttl: int, hard_ttl: int) -> "CacheEntry":
+        """The same body, stored now: for refreshes that found nothing changed."""
+        entry = CacheEntry(
+            self.body,
+            time.time(),
+            ttl,
+            hard_ttl,
+            self.gzip,
+            self.br,
+            self.etag,
+            self.version,
+            upstream=self.upstream,
+        )
+        entry._value = self._value
+        return entry
+
+    @property
+    def value(self) -> Any:
+        if self._value is _MISSING:
+            self._value = orjson.loads(self.body)
+        return self._value
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.stored_at)
+
+    @property
+    def fresh(self) -> bool:
+        return self.age < self.ttl
+
+    @property
+    def remaining(self) -> float:
+        """Seconds until the hard TTL expires."""
+        return self.hard_ttl - self.age
+
+    def meta(self) -> bytes:
+        meta = {
+            "at": self.stored_at,
+            "ttl": self.ttl,
+            "hard": self.hard_ttl,
+            "etag": self.etag,
+            "ver": self.version,
+        }
+        if self.negative:
+            meta["neg"] = self.negative
+        if self.upstream:
+            meta["up"] = self.upstream
+        return orjson.dumps(meta)
+
+    @classmethod
+    def load(cls, body: bytes, meta: bytes, gz: bytes, br: bytes) -> "CacheEntry":
+        m = orjson.loads(meta)
+        return cls(
+            body,
+            m["at"],
+            m["ttl"],
+            m["hard"],
+            gz or b"",
+            br or b"",
+            m.get("etag", ""),
+            m.get("ver", 0),
+            m.get("neg", 0),
+            m.get("up"),
+        )
+
+    def encoded(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """Pick the smallest variant the client accepts: (body, content-encoding)."""
+        accepted = _accepted_encodings(accept_encoding)
+        if self.br and "br" in accepted:
+            return self.br, "br"
+        if self.gzip and "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.body, None
+
+
+class AdaptiveTTL:
+    """Per-key TTL policy: starts at ``base`` and moves within [low, high].
+
+    The current TTL of a key is the one on its stored entry, so what one
+    worker learns is shared with the others through Redis. Growth is scaled
+    by how much of that TTL had passed, so frequent refreshes (a watcher
+    polling every WATCH_INTERVAL) grow it no faster than expiry would.
+    """
+
+    __slots__ = ("base", "low", "high")
+
+    def __init__(
+        self, base: int, low: Optional[int] = None, high: Optional[int] = None
+    ):
+        self.base = base
+        self.low = low if low is not None else int(base * config.CACHE_TTL_MIN_FACTOR)
+        self.high = (
+            high if high is not None else int(base * config.CACHE_TTL_MAX_FACTOR)
+        )
+
+    def next(self, previous: Optional[CacheEntry], changed: bool) -> int:
+        """TTL for a refreshed entry, given whether its value changed."""
+        if previous is None or not config.CACHE_ADAPTIVE_TTL:
+            return self.base
+        if changed:
+            factor = config.CACHE_TTL_SHRINK
+        else:
+            elapsed = min(1.0, previous.age / previous.ttl) if previous.ttl > 0 else 1.0
+            factor = config.CACHE_TTL_GROW**elapsed
+        return int(min(self.high, max(self.low, previous.ttl * factor)))
+
+
+def _not_modified(entry: CacheEntry, request: Request) -> bool:
+    """Evaluate If-None-Match (or, without it, If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = (t.strip() for t in if_none_match.split(","))
+        return any(t.removeprefix("W/").strip('"') == entry.etag for t in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry.stored_at) <= since
+    return False
+
+
+def http_response(entry: CacheEntry, request: Request) -> Response:
+    """The entry as an HTTP response with validators and freshness headers."""
+    headers = {
+        "ETag": f'W/"{entry.etag}"',
+        "Last-Modified": formatdate(entry.stored_at, usegmt=True),
+        "Cache-Control": freshness(entry),
+        "Vary": "Accept-Encoding",
+        "X-Version": str(entry.version),
+    }
+    if _not_modified(entry, request):
+        return Response(status_code=304, headers=headers)
+
+    body, encoding = entry.encoded(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def freshness(entry: CacheEntry) -> str:
+    """Cache-Control for a response built from the entry."""
+    return f"public, max-age={max(0, int(entry.ttl - entry.age))}"
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted, refused = set(), set()
+    for part in header.lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        (accepted if q > 0 else refused).add(coding.strip())
+    if "*" in accepted:
+        accepted.update({"br", "gzip"} - refused)
+    return accepted
+
+
+def _l1_get(key: str) -> Optional[CacheEntry]:
+    item = _l1.get(key)
+    if item is None:
+        return None
+    if item[0] <= time.monotonic():
+        del _l1[key]
+        return None
+    _l1.move_to_end(key)
+    return item[1]
+
+
+def _l1_set(key: str, entry: CacheEntry, pin: bool = False):
+    remaining = entry.remaining
+    if remaining <= 0:
+        return
+    _l1[key] = (time.monotonic() + remaining, entry, pin)
+    _l1.move_to_end(key)
+    while len(_l1) > config.CACHE_L1_MAX_ITEMS:
+        victim = next((k for k, item in _l1.items() if not item[2]), None)
+        if victim is None:
+            break
+        del _l1[victim]
+
+
+def _l1_clear():
+    _l1.clear()
+
+
+async def _listen_invalidations():
+    """Drop L1 entries that other workers have overwritten or invalidated."""
+    while True:
+        r = await available_redis()
+        if r is None:
+            await asyncio.sleep(config.REDIS_BACKOFF)
+            continue
+        try:
+            async with r.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # We may have missed messages while disconnected.
+                _l1_clear()
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is None:
+                        continue
+                    origin, _, key = message["data"].decode().partition(":")
+                    if origin != _worker_id:
+                        _l1.pop(key, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _mark_down()
+
+
+def start_cache_listener():
+    """Start the pub/sub invalidation listener for this worker."""
+    global _listener
+    if _listener is None:
+        _listener = asyncio.get_running_loop().create_task(_listen_invalidations())
+
+
+async def get_entry(
+    key: str, pin: bool = False, restore: bool = True
+) -> Optional[CacheEntry]:
+    """Return the entry for a key, fresh or stale, from L1 or Redis.
+
+    With restore, a key in neither is looked up in the last-known-good store.
+    """
+    entry = _l1_get(key)
+    if entry is not None:
+        return entry
+
+    r = await available_redis()
+    if r is None:
+        return await _restore(key, pin, None) if restore else None
     try:
-        r = await get_redis()
-        data = await r.get(key)
-        if data:
-            return orjson.loads(data)
+        body, meta, gz, br = await r.hmget(key, "body", "meta", "gz", "br")
+        _mark_up()
     except Exception:
-        pass
-    return None
+        _mark_down()
+        return await _restore(key, pin, None) if restore else None
+
+    if not body or not meta:
+        return await _restore(key, pin, r) if restore else None
+    entry = CacheEntry.load(body, meta, gz, br)
+    _l1_set(key, entry, pin)
+    return entry
+
+
+async def _restore(
+    key: str, pin: bool, r: Optional[redis.Redis]
+) -> Optional[CacheEntry]:
+    """Seed L1 (and Redis, if up) with a key's stored entry, if within its hard TTL."""
+    row = await store.load_entry(key)
+    if row is None:
+        return None
+    entry = CacheEntry.load(*row)
+    if entry.remaining <= 0:
+        return None  # too old to cache; _fill still falls back to it
+    _l1_set(key, entry, pin)
+    if r is not None:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping=dict(zip(("body", "meta", "gz", "br"), row)))
+                pipe.expire(key, int(entry.remaining) + 1)
+                await pipe.execute()
+        except Exception:
+            _mark_down()
+    return entry
 
 
-async def set_cached(key: str, value: Any, ttl: int = 300):
+async def _last_known_good(key: str) -> Optional[CacheEntry]:
+    """A key's stored entry however old, for when upstream fails with nothing cached."""
+    row = await store.load_entry(key)
+    if row is None:
+        return None
+    entry = CacheEntry.load(*row)
+    if entry.negative:
+        return None  # an old 404 says nothing about why upstream fails now
+    logger.warning("Upstream failed; serving %s as stored %.0f s ago", key, entry.age)
+    return entry
+
+
+async def prefetch(keys: List[str]) -> Dict[str, CacheEntry]:
+    """Entries for many keys, reading the ones not in L1 in one Redis round trip.
+
+    What is found lands in L1, so lookups that follow don't touch Redis.
+    """
+    found: Dict[str, CacheEntry] = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        entry = _l1_get(key)
+        if entry is not None:
+            found[key] = entry
+        else:
+            missing.append(key)
+
+    r = await available_redis() if missing else None
+    if r is None:
+        return found
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for key in missing:
+                pipe.hmget(key, "body", "meta", "gz", "br")
+            rows = await pipe.execute()
+        _mark_up()
+    except Exception:
+        _mark_down()
+        return found
+
+    for key, (body, meta, gz, br) in zip(missing, rows):
+        if body and meta:
+            found[key] = CacheEntry.load(body, meta, gz, br)
+            _l1_set(key, found[key])
+    return found
+
+
+async def set_entry(key: str, entry: CacheEntry, pin: bool = False):
+    _l1_set(key, entry, pin)
+    store.save_entry(key, entry.body, entry.meta(), entry.gzip, entry.br)
+
+    r = await available_redis()
+    if r is None:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            fields = {
+                "body": entry.body,
+                "meta": entry.meta(),
+                "gz": entry.gzip,
+                "br": entry.br,
+            }
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, entry.hard_ttl)
+            pipe.publish(INVALIDATION_CHANNEL, f"{_worker_id}:{key}")
+            await pipe.execute()
+        _mark_up()
+    except Exception:
+        _mark_down()
+
+
+async def get_cached(key: str, pin: bool = False) -> Optional[Any]:
+    entry = await get_entry(key, pin)
+    return entry.value if entry is not None else None
+
+
+async def set_cached(
+    key: str,
+    value: Any,
+    ttl: int = 300,
+    stale_ttl: Optional[int] = None,
+    pin: bool = False,
+):
+    """Cache a value: fresh for ttl, then servable as stale for stale_ttl more."""
+    if stale_ttl is None:
+        stale_ttl = config.CACHE_STALE_TTL
+    await set_entry(key, CacheEntry.create(value, ttl, ttl + stale_ttl), pin)
+
+
+async def invalidate(key: str):
+    """Drop a key from Redis, from every worker's L1 and from the store."""
+    _l1.pop(key, None)
+    store.delete_entry(key)
+    r = await available_redis()
+    if r is None:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.delete(key)
+            pipe.publish(INVALIDATION_CHANNEL, f"{_worker_id}:{key}")
+            await pipe.execute()
+        _mark_up()
+    except Exception:
+        _mark_down()
+
+
+async def _acquire_lock(key: str) -> Optional[str]:
+    """Try to take the fill lock for a key. Returns a token, or None if held."""
+    token = uuid.uuid4().hex
+    r = await available_redis()
+    if r is None:
+        # Without Redis there is nobody to coordinate with.
+        return token
+    try:
+        acquired = await r.set(
+            f"lock:{key}", token, nx=True, px=int(config.CACHE_LOCK_TTL * 1000)
+        )
+        return token if acquired else None
+    except Exception:
+        _mark_down()
+        return token
+
+
+async def _release_lock(key: str, token: str):
+    r = await available_redis()
+    if r is None:
+        return
     try:
-        r = await get_redis()
-        await r.setex(key, ttl, orjson.dumps(value))
+        await r.eval(_RELEASE_LOCK, 1, f"lock:{key}", token)
     except Exception:
-        pass
+        _mark_down()
+
+
+async def hold_lease(name: str, ttl: float) -> bool:
+    """Take or renew a worker-wide lease (e.g. for leader-only background jobs).
+
+    Returns False while Redis is unavailable, so leader-only work pauses
+    rather than running on every worker at once.
+    """
+    r = await available_redis()
+    if r is None:
+        return False
+    try:
+        held = await r.eval(
+            _HOLD_LEASE, 1, f"lease:{name}", _worker_id, int(ttl * 1000)
+        )
+        _mark_up()
+        return bool(held)
+    except Exception:
+        _mark_down()
+        return False
+
+
+def refresh_stats() -> dict:
+    """How many refreshes ran and how many found upstream unchanged.
+
+    ``same_value`` counts refreshes that fetched and parsed new upstream bytes
+    but produced the value already cached; like the no-ops, they stretch the
+    key's TTL.
+    """
+    refreshes = _refresh_stats["refreshes"]
+    unchanged = _refresh_stats["not_modified"] + _refresh_stats["same_body"]
+    return {
+        "refreshes": refreshes,
+        "not_modified": _refresh_stats["not_modified"],
+        "same_body": _refresh_stats["same_body"],
+        "same_value": _refresh_stats["same_value"],
+        "changed": _refresh_stats["changed"],
+        "noop_ratio": round(unchanged / refreshes, 3) if refreshes else None,
+    }
+
+
+def count_access(enabled: bool):
+    """Start or stop counting reads per key for ``drain_access_counts``."""
+    global _counting_access
+    _counting_access = enabled
+    if not enabled:
+        _access_counts.clear()
 
 
-def cached(key_prefix: str, ttl: int = 300):
+def drain_access_counts() -> Dict[str, int]:
+    """Return and reset the per-key read counts seen by this worker."""
+    counts = dict(_access_counts)
+    _access_counts.clear()
+    return counts
+
+
+async def _wait_for_value(key: str, pin: bool) -> Optional[CacheEntry]:
+    """Wait for another worker's fill to land, or for its lock to go away."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.CACHE_LOCK_TTL
+    while loop.time() < deadline:
+        await asyncio.sleep(config.CACHE_LOCK_POLL)
+        entry = await get_entry(key, pin, restore=False)
+        if entry is not None:
+            return entry
+        r = await available_redis()
+        if r is None:
+            return None
+        try:
+            if not await r.exists(f"lock:{key}"):
+                return None
+        except Exception:
+            _mark_down()
+            return None
+    return None
+
+
+async def _fill(
+    key: str,
+    policy: AdaptiveTTL,
+    stale_ttl: int,
+    pin: bool,
+    func: Callable,
+    args: tuple,
+    kwargs: dict,
+    stale: Optional[CacheEntry] = None,
+) -> CacheEntry:
+    """Fetch and store a key once across workers.
+
+    With a stale entry in hand this never blocks on other workers, and an
+    upstream failure returns the stale entry instead of raising.
+    """
+    token = await _acquire_lock(key)
+    if token is None:
+        if stale is not None:
+            return stale  # another worker is already refreshing it
+        with span("cache-wait"):  # for another worker's fill
+            entry = await _wait_for_value(key, pin)
+        if entry is not None:
+            return entry
+        token = await _acquire_lock(key)
+
+    try:
+        # Another worker may have filled the key while we were taking the lock.
+        entry = await get_entry(key, pin, restore=False)
+        if entry is not None and (stale is None or entry.stored_at > stale.stored_at):
+            return entry
+
+        if stale is not None:
+            _refresh_stats["refreshes"] += 1
+        # Upstream requests may be conditional only when there is a value to
+        # keep, and only on what that value was built from.
+        conditional = revalidating.set(stale.upstream if stale is not None else None)
+        upstream: dict = {}
+        collecting = fetched.set(upstream)
+        try:
+            result = await func(*args, **kwargs)
+        except UpstreamUnchanged as e:
+            _refresh_failed.pop(key, None)
+            _refresh_stats[e.reason] += 1
+            ttl = policy.next(stale, changed=False)
+            entry = _brief_if_empty(stale.renewed(ttl, ttl + stale_ttl), stale_ttl)
+            # Same body, possibly new validators for it.
+            entry.upstream = {**stale.upstream, **upstream}
+            await set_entry(key, entry, pin)
+            return entry
+        except Exception as e:
+            if stale is None:
+                if isinstance(e, HTTPException) and e.status_code < 500:
+                    # Upstream says it doesn't exist; don't ask again for a while.
+                    if e.status_code == 404:
+                        negative = CacheEntry.failure(
+                            404, e.detail, config.CACHE_NEGATIVE_TTL
+                        )
+                        await set_entry(key, negative, pin)
+                    raise
+                fallback = await _last_known_good(key)
+                if fallback is None:
+                    raise
+                return fallback
+            _refresh_failed[key] = time.monotonic() + config.CACHE_REFRESH_RETRY
+            return stale
+        finally:
+            revalidating.reset(conditional)
+            fetched.reset(collecting)
+
+        _refresh_failed.pop(key, None)
+        with span("serialize"):
+            entry = CacheEntry.create(result, policy.base, policy.base + stale_ttl)
+        if stale is not None:
+            # Upstream bytes differed, but the shaped value may not have.
+            changed = entry.etag != stale.etag
+            _refresh_stats["changed" if changed else "same_value"] += 1
+            if changed:
+                entry.version = max(entry.version, stale.version + 1)
+            ttl = policy.next(stale, changed)
+            entry = (entry if changed else stale).renewed(ttl, ttl + stale_ttl)
+        entry = _brief_if_empty(entry, stale_ttl)
+        # Recorded only now that a value was built from these responses.
+        entry.upstream = upstream
+        await set_entry(key, entry, pin)
+        return entry
+    finally:
+        if token:
+            await _release_lock(key, token)
+
+
+def _brief_if_empty(entry: CacheEntry, stale_ttl: int) -> CacheEntry:
+    """Keep an empty result (``count`` 0) only CACHE_NEGATIVE_TTL, so it is re-checked soon."""
+    ttl = config.CACHE_NEGATIVE_TTL
+    # Only a small body can hold an empty list; don't decode big ones to check.
+    if entry.ttl <= ttl or len(entry.body) > _EMPTY_MAX_BYTES:
+        return entry
+    value = entry.value
+    if isinstance(value, dict) and value.get("count") == 0:
+        return entry.renewed(ttl, ttl + stale_ttl)
+    return entry
+
+
+def _single_flight(key: str, fill: Callable) -> asyncio.Task:
+    """Return the in-flight fill for a key, starting one if needed."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fill())
+        _inflight[key] = task
+
+        def _done(t: asyncio.Task):
+            if _inflight.get(key) is t:
+                del _inflight[key]
+            if not t.cancelled():
+                t.exception()  # mark retrieved; waiters re-raise it
+
+        task.add_done_callback(_done)
+    return task
+
+
+def _mark_response(entry: CacheEntry, status: str):
+    set_response_header("X-Cache", status)
+    set_response_header("Age", str(int(entry.age)))
+
+
+def cached(
+    key_prefix: str,
+    ttl: int = 300,
+    stale_ttl: Optional[int] = None,
+    pin: bool = False,
+    min_ttl: Optional[int] = None,
+    max_ttl: Optional[int] = None,
+    normalize: Optional[Dict[str, Callable[[str], str]]] = None,
+):
+    """Cache an async function's result under key_prefix plus its kwargs.
+
+    ttl is where a key starts; refreshes move it between min_ttl and max_ttl
+    (by default fractions of ttl) as the key is seen to change or not.
+    normalize maps kwarg names to canonicalizers (see ``app.services.keys``);
+    the function is called with the canonical values too.
+
+    Past its TTL the stale value is returned immediately while one background
+    task refreshes it; if the refresh fails the stale value keeps being served
+    (``X-Cache: STALE``) until stale_ttl more seconds have passed. Upstream
+    404s and empty results are cached for CACHE_NEGATIVE_TTL. pin keeps
+    the value in every worker's L1 regardless of LRU pressure.
+
+    Routes should ``return await func.response(request, **kwargs)``, which
+    sends the stored bytes without decoding them; calling the function itself
+    still returns the Python value.
+    """
+    if stale_ttl is None:
+        stale_ttl = config.CACHE_STALE_TTL
+    policy = AdaptiveTTL(ttl, min_ttl, max_ttl)
+    normalize = normalize or {}
+
+    hits, misses, stale_hits, negative_hits = (
+        batched(CACHE_LOOKUPS.labels(key_prefix, result))
+        for result in ("hit", "miss", "stale", "negative")
+    )
+
     def decorator(func: Callable):
+        def canonical(kwargs: dict) -> dict:
+            return {
+                name: normalize[name](value) if name in normalize else value
+                for name, value in kwargs.items()
+            }
+
+        def make_key(kwargs: dict) -> str:
+            return ":".join(
+                [key_prefix] + [str(kwargs[name]) for name in sorted(kwargs)]
+            )
+
+        async def lookup(args: tuple, kwargs: dict, mark: bool = True) -> CacheEntry:
+            kwargs = canonical(kwargs)
+            cache_key = make_key(kwargs)
+            if _counting_access and (
+                cache_key in _access_counts or len(_access_counts) < _MAX_COUNTED_KEYS
+            ):
+                _access_counts[cache_key] += 1
+
+            def fill(stale: Optional[CacheEntry] = None):
+                return lambda: _fill(
+                    cache_key, policy, stale_ttl, pin, func, args, kwargs, stale
+                )
+
+            # An L1 hit is cheaper than timing it; only time trips to Redis.
+            entry = _l1_get(cache_key)
+            if entry is None:
+                with span("cache"):
+                    entry = await get_entry(cache_key, pin)
+            if entry is not None and entry.negative:
+                if entry.fresh:
+                    negative_hits.inc()
+                    raise entry.error()
+                entry = None  # expired: ask upstream again
+            if entry is not None:
+                if entry.fresh:
+                    hits.inc()
+                    if mark:
+                        _mark_response(entry, "HIT")
+                    return entry
+                stale_hits.inc()
+                if _refresh_failed.get(cache_key, 0.0) <= time.monotonic():
+                    _single_flight(cache_key, fill(entry))
+                if mark:
+                    _mark_response(entry, "STALE")
+                return entry
+
+            misses.inc()
+            task = _single_flight(cache_key, fill())
+            # Shielded so one disconnecting client doesn't cancel the others' fill.
+            with span("fill"):
+                entry = await asyncio.shield(task)
+            if entry.negative:
+                raise entry.error()
+            if mark:
+                _mark_response(entry, "MISS" if entry.fresh else "STALE")
+            return entry
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            key_parts = [key_prefix] + [str(v) for v in kwargs.values()]
-            cache_key = ":".join(key_parts)
+            return (await lookup(args, kwargs)).value
 
-            cached_data = await get_cached(cache_key)
-            if cached_data is not None:
-                return cached_data
+        async def response(request: Request, **kwargs) -> Response:
+            """Serve the cached JSON bytes as stored, compressed if accepted.
 
-            result = await func(*args, **kwargs)
-            await set_cached(cache_key, result, ttl)
-            return result
+            Carries ETag/Last-Modified/Cache-Control from the entry and answers
+            a matching conditional request with 304.
+            """
+            return http_response(await lookup((), kwargs), request)
+
+        async def entry(**kwargs) -> CacheEntry:
+            """The cache entry itself, for callers that derive data from it.
+
+            Unlike the other accessors it doesn't set X-Cache/Age.
+            """
+            return await lookup((), kwargs, mark=False)
+
+        async def response_entry(**kwargs) -> CacheEntry:
+            """The entry, for routes that build their own response from it.
+
+            Sets X-Cache/Age like ``response``.
+            """
+            return await lookup((), kwargs)
+
+        async def refresh(ahead: float = 0.0, **kwargs):
+            """Re-fetch the entry for kwargs if missing or older than ahead * its TTL."""
+            kwargs = canonical(kwargs)
+            cache_key = make_key(kwargs)
+            entry = await get_entry(cache_key, pin)
+            if entry is not None and entry.age < entry.ttl * ahead:
+                return
+            if entry is not None and entry.negative:
+                entry = None  # nothing to keep serving if the refresh fails
+            task = _single_flight(
+                cache_key,
+                lambda: _fill(
+                    cache_key, policy, stale_ttl, pin, func, (), kwargs, entry
+                ),
+            )
+            await asyncio.shield(task)
 
+        wrapper.cache_key = lambda **kwargs: make_key(canonical(kwargs))
+        wrapper.key_prefix = key_prefix
+        wrapper.ttl = ttl
+        wrapper.refresh = refresh
+        wrapper.response = response
+        wrapper.entry = entry
+        wrapper.response_entry = response_entry
         return wrapper
 
     return decorator
@@ -0,0 +1,243 @@
+"""
+Nearby-theater lookups.
+
+Each cached venue snapshot gets a ``GeoIndex``: a grid of fixed-size
+lat/lon cells over the venues, so a query only measures distances to venues
+in the cells its radius touches. Distances are computed with numpy when it is
+installed and in a plain loop otherwise. Indexes are built once per snapshot
+(keyed by its ETag) and kept per worker.
+
+To search without knowing the region, each venue fetch records the region's
+bounding box in a Redis hash; a query loads only the regions whose box comes
+within its radius.
+"""
+
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import orjson
+from app.core import config
+from app.services.cache import CacheEntry, available_redis
+
+try:
+    import numpy as np
+except ImportError:  # optional: without it distances are computed in a loop
+    np = None
+
+REGION_BOUNDS = "geo:regions"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195
+
+Bounds = Tuple[float, float, float, float]  # min lat, min lon, max lat, max lon
+
+# region code -> (snapshot ETag, index)
+_indexes: Dict[str, Tuple[str, "GeoIndex"]] = {}
+_bounds: Dict[str, Bounds] = {}
+_bounds_loaded_at = 0.0
+
+
+def _coordinates(theater: dict) -> Optional[Tuple[float, float]]:
+    lat, lon = theater.get("latitude"), theater.get("longitude")
+    if lat is None or lon is None or (lat == 0 and lon == 0):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def _lon_degrees(radius_km: float, lat: float) -> float:
+    """Longitude span of radius_km at a latitude."""
+    scale = math.cos(math.radians(min(abs(lat), 89.0)))
+    return radius_km / (KM_PER_DEGREE * scale)
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+class GeoIndex:
+    """Grid index over the theaters of one venue snapshot."""
+
+    def __init__(self, theaters: List[dict], cell: float = config.GEO_CELL_DEGREES):
+        self.cell = cell
+        self.theaters: List[dict] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for theater in theaters:
+            point = _coordinates(theater)
+            if point is None:
+                continue
+            i = len(self.theaters)
+            self.theaters.append(theater)
+            lats.append(point[0])
+            lons.append(point[1])
+            cells.setdefault(self._cell(*point), []).append(i)
+
+        if np is not None:
+            self.lat = np.radians(np.array(lats, dtype=np.float64))
+            self.lon = np.radians(np.array(lons, dtype=np.float64))
+            self.cells = {c: np.array(ids, dtype=np.intp) for c, ids in cells.items()}
+        else:
+            self.lat, self.lon = lats, lons
+            self.cells = cells
+
+    def __len__(self) -> int:
+        return len(self.theaters)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> list:
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = _lon_degrees(radius_km, lat)
+        lat0, lon0 = self._cell(lat - dlat, lon - dlon)
+        lat1, lon1 = self._cell(lat + dlat, lon + dlon)
+        if (lat1 - lat0 + 1) * (lon1 - lon0 + 1) <= len(self.cells):
+            keys = (
+                (i, j) for i in range(lat0, lat1 + 1) for j in range(lon0, lon1 + 1)
+            )
+            return [self.cells[k] for k in keys if k in self.cells]
+        # A radius wider than the populated area: walk the populated cells instead.
+        return [
+            ids
+            for (i, j), ids in self.cells.items()
+            if lat0 <= i <= lat1 and lon0 <= j <= lon1
+        ]
+
+    def query(
+        self, lat: float, lon: float, radius_km: float, limit: int
+    ) -> List[Tuple[float, dict]]:
+        """Up to limit (distance_km, theater) pairs within radius_km, nearest first."""
+        groups = self._candidates(lat, lon, radius_km)
+        if not groups:
+            return []
+        if np is None:
+            found = []
+            for ids in groups:
+                for i in ids:
+                    d = _haversine_km(lat, lon, self.lat[i], self.lon[i])
+                    if d <= radius_km:
+                        found.append((d, i))
+            found.sort()
+            return [(d, self.theaters[i]) for d, i in found[:limit]]
+
+        ids = groups[0] if len(groups) == 1 else np.concatenate(groups)
+        phi, lam = math.radians(lat), math.radians(lon)
+        lats = self.lat[ids]
+        a = (
+            np.sin((lats - phi) / 2) ** 2
+            + math.cos(phi) * np.cos(lats) * np.sin((self.lon[ids] - lam) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        inside = distances <= radius_km
+        ids, distances = ids[inside], distances[inside]
+        if len(ids) > limit:
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            ids, distances = ids[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+        return [(float(distances[k]), self.theaters[ids[k]]) for k in order]
+
+
+def _box_distance_km(bounds: Bounds, lat: float, lon: float) -> float:
+    """Distance from a point to the nearest edge of a bounding box (0 inside)."""
+    nearest_lat = min(max(lat, bounds[0]), bounds[2])
+    nearest_lon = min(max(lon, bounds[1]), bounds[3])
+    return _haversine_km(lat, lon, nearest_lat, nearest_lon)
+
+
+def bounds_of(theaters: List[dict]) -> Optional[Bounds]:
+    """Bounding box of the theaters that have usable coordinates."""
+    points = [p for p in map(_coordinates, theaters) if p is not None]
+    if not points:
+        return None
+    lats = [p[0] for p in points]
+    lons = [p[1] for p in points]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+async def record_bounds(region: str, theaters: List[dict]):
+    """Publish a region's bounding box so nearby queries can find it."""
+    bounds = bounds_of(theaters)
+    if bounds is None or _bounds.get(region) == bounds:
+        return
+    _bounds[region] = bounds
+    r = await available_redis()
+    if r is None:
+        return
+    try:
+        await r.hset(REGION_BOUNDS, region, orjson.dumps(bounds))
+    except Exception:
+        pass
+
+
+async def _load_bounds():
+    """Refresh this worker's copy of the region bounding boxes."""
+    global _bounds_loaded_at
+    if time.monotonic() - _bounds_loaded_at < config.GEO_BOUNDS_REFRESH:
+        return
+    _bounds_loaded_at = time.monotonic()
+    r = await available_redis()
+    if r is None:
+        return
+    try:
+        stored = await r.hgetall(REGION_BOUNDS)
+    except Exception:
+        return
+    for region, raw in stored.items():
+        _bounds[region.decode()] = tuple(orjson.loads(raw))
+
+
+async def region_index(
+    region: str, load: Callable[..., Awaitable[CacheEntry]]
+) -> GeoIndex:
+    """The index for a region's current venue snapshot, building it if needed.
+
+    load is the theaters function's ``entry`` loader.
+    """
+    entry = await load(region=region)
+    known = _indexes.get(region)
+    if known is not None and known[0] == entry.etag:
+        return known[1]
+    index = GeoIndex(entry.value.get("theaters", []))
+    _indexes[region] = (entry.etag, index)
+    return index
+
+
+async def regions_near(lat: float, lon: float, radius_km: float) -> List[str]:
+    """Known regions whose venues could lie within radius_km, closest first."""
+    await _load_bounds()
+    near = sorted(
+        (distance, region)
+        for region, bounds in _bounds.items()
+        for distance in (_box_distance_km(bounds, lat, lon),)
+        if distance <= radius_km
+    )
+    return [region for _, region in near[: config.GEO_MAX_REGIONS]]
+
+
+async def nearby(
+    lat: float,
+    lon: float,
+    radius_km: float,
+    limit: int,
+    load: Callable[..., Awaitable[CacheEntry]],
+    region: Optional[str] = None,
+) -> Tuple[List[str], List[Tuple[float, dict]]]:
+    """Theaters within radius_km of a point: (regions searched, results).
+
+    Searches region if given, otherwise the indexed regions around the point.
+    """
+    regions = [region] if region else await regions_near(lat, lon, radius_km)
+    found: List[Tuple[float, dict]] = []
+    for code in regions:
+        index = await region_index(code, load)
+        found.extend(index.query(lat, lon, radius_km, limit))
+    if len(regions) > 1:
+        found.sort(key=lambda pair: pair[0])
+    return regions, found[:limit]
@@ -1,32 +1,283 @@
 """
 HTTP client with Cloudflare bypass using curl-cffi.
+
+Upstream calls share a small pool of long-lived native async sessions so
+connections (and their TLS/HTTP2 state) are reused across requests instead of
+paying a fresh handshake on a worker thread for every call. Each call also goes
+through its endpoint family's circuit breaker and adaptive concurrency limit.
+
+Validators (ETag/Last-Modified) and a hash of every body fetched during a
+cache fill are collected for the cache, which stores them with the value it
+builds from those bodies, only once that value was built. While a refresh
+runs with the previous entry in hand, requests are made conditional on that
+entry's validators, and a 304 or an identical body raises UpstreamUnchanged
+so the caller can keep the entry instead of parsing the page again.
+
+New 200 bodies (for streamed pages, the part that was read) are queued for
+the last-known-good store, so parsers can be re-run over them later.
 """
 
 import asyncio
-from curl_cffi import requests as cf_requests
+import hashlib
+import time
+from contextvars import ContextVar
+from itertools import cycle
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+from curl_cffi import CurlHttpVersion, CurlMOpt
+from curl_cffi.aio import AsyncCurl
+from curl_cffi.requests import AsyncSession, Response
 from fastapi import HTTPException
 from app.core import config
+from app.core.metrics import UPSTREAM_SECONDS
+from app.core.tracing import add_span, span
+from app.services import breaker, store
 
+# Receives body chunks; returns True once it has read enough.
+ChunkConsumer = Callable[[bytes], bool]
 
-async def fetch_json(url: str, params: dict = None) -> dict:
-    """Fetch JSON from URL using curl-cffi to bypass Cloudflare."""
+# Set by the cache while refreshing a key it already has a value for: the
+# validators stored with that value, per URL (see _Seen.dump).
+revalidating: ContextVar[Optional[dict]] = ContextVar("revalidating", default=None)
+# Set by the cache during a fill: receives the validators of each URL fetched.
+fetched: ContextVar[Optional[dict]] = ContextVar("fetched", default=None)
+
+_sessions: List[AsyncSession] = []
+_session_cycle: Optional[Iterator[AsyncSession]] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+class UpstreamUnchanged(Exception):
+    """The resource is the same as on the last fetch (a 304 or the same body)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Seen:
+    """What a fetch of a URL returned.
+
+    digest covers the first length bytes of the body: all of it when complete,
+    otherwise the part a streaming consumer read before it stopped.
+    """
+
+    __slots__ = ("etag", "last_modified", "digest", "length", "complete")
+
+    def __init__(self, etag, last_modified, digest: bytes, length: int, complete: bool):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.length = length
+        self.complete = complete
+
+    def dump(self) -> list:
+        """A JSON-serializable form, for storing with a cache entry."""
+        digest = self.digest.hex()
+        return [self.etag, self.last_modified, digest, self.length, self.complete]
+
+    @classmethod
+    def load(cls, dumped: list) -> "_Seen":
+        etag, last_modified, digest, length, complete = dumped
+        return cls(etag, last_modified, bytes.fromhex(digest), length, complete)
+
+
+def _seen_key(url: str, params: Optional[dict]) -> str:
+    return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+
+def _known(key: str) -> Optional[_Seen]:
+    validators = revalidating.get()
+    if not validators or key not in validators:
+        return None
     try:
-        if params:
-            param_str = "&".join(f"{k}={v}" for k, v in params.items())
-            url = f"{url}?{param_str}"
-
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: cf_requests.get(
-                url, impersonate="chrome120", headers=config.BMS_HEADERS, timeout=30
-            ),
+        return _Seen.load(validators[key])
+    except (TypeError, ValueError):
+        return None
+
+
+def _remember(key: str, response: Response, digest: bytes, length: int, complete: bool):
+    collected = fetched.get()
+    if collected is None:
+        return
+    collected[key] = _Seen(
+        response.headers.get("etag"),
+        response.headers.get("last-modified"),
+        digest,
+        length,
+        complete,
+    ).dump()
+
+
+def _digest(data: bytes = b""):
+    return hashlib.blake2b(data, digest_size=16)
+
+
+def _create_session() -> AsyncSession:
+    acurl = AsyncCurl()
+    acurl.setopt(CurlMOpt.MAX_HOST_CONNECTIONS, config.HTTP_MAX_PER_HOST)
+    acurl.setopt(CurlMOpt.MAX_TOTAL_CONNECTIONS, config.HTTP_MAX_CONCURRENCY)
+    return AsyncSession(
+        async_curl=acurl,
+        max_clients=max(1, config.HTTP_MAX_CONCURRENCY // config.HTTP_POOL_SIZE),
+        impersonate=config.HTTP_IMPERSONATE,
+        headers=config.BMS_HEADERS,
+        timeout=config.HTTP_TIMEOUT,
+        http_version=CurlHttpVersion.V2TLS,
+    )
+
+
+def _get_session() -> AsyncSession:
+    """Return the next pooled session, creating the pool on first use."""
+    global _session_cycle, _semaphore
+    if _session_cycle is None:
+        _sessions.extend(_create_session() for _ in range(config.HTTP_POOL_SIZE))
+        _session_cycle = cycle(_sessions)
+        _semaphore = asyncio.Semaphore(config.HTTP_MAX_CONCURRENCY)
+    return next(_session_cycle)
+
+
+async def _feed(
+    chunks: AsyncIterator[bytes], consume: ChunkConsumer, known: Optional[_Seen]
+) -> Tuple[bool, bytes, int, bool]:
+    """Stream chunks into consume: returns (unchanged, digest, length, complete).
+
+    With known, chunks are held back until the prefix it covers has arrived;
+    if that prefix is the same, consume never sees the body at all.
+    """
+    held: List[bytes] = []
+    if known is not None:
+        size = 0
+        ended = True
+        async for chunk in chunks:
+            held.append(chunk)
+            size += len(chunk)
+            if size > known.length or (size == known.length and not known.complete):
+                ended = False
+                break
+        prefix = b"".join(held)[: known.length]
+        same_length = size == known.length or not known.complete
+        if same_length and len(prefix) == known.length:
+            if _digest(prefix).digest() == known.digest and (
+                ended or not known.complete
+            ):
+                return True, known.digest, known.length, known.complete
+
+    fed = _digest()
+    length = 0
+
+    def feed(chunk: bytes) -> bool:
+        nonlocal length
+        fed.update(chunk)
+        length += len(chunk)
+        return consume(chunk)
+
+    for chunk in held:
+        if feed(chunk):
+            return False, fed.digest(), length, False
+    async for chunk in chunks:
+        if feed(chunk):
+            return False, fed.digest(), length, False
+    return False, fed.digest(), length, True
+
+
+async def _request(
+    url: str, params: dict = None, consume: Optional[ChunkConsumer] = None
+) -> Response:
+    """Make one guarded upstream GET.
+
+    With consume, the body is streamed into it chunk by chunk until it returns
+    True, and the rest of the transfer is abandoned.
+
+    Raises UpstreamUnchanged only while revalidating.
+    """
+    key = _seen_key(url, params)
+    known = _known(key)
+    headers = {}
+    if known is not None:
+        if known.etag:
+            headers["If-None-Match"] = known.etag
+        if known.last_modified:
+            headers["If-Modified-Since"] = known.last_modified
+
+    read: List[bytes] = []
+    if consume is not None and store.enabled():
+        parse = consume
+
+        def consume(chunk: bytes) -> bool:
+            read.append(chunk)
+            return parse(chunk)
+
+    session = _get_session()
+    guard = breaker.guard_for(url)
+    if not await guard.start():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Upstream {guard.family} is failing; circuit is open.",
         )
 
-        if response.status_code == 403:
-            raise HTTPException(
-                status_code=503, detail="Cloudflare is blocking requests."
-            )
+    unchanged = None
+    started = None
+    queued = time.perf_counter()
+    try:
+        async with _semaphore:
+            started = time.perf_counter()
+            add_span("upstream-wait", started - queued)
+            if consume is None:
+                response = await session.get(url, params=params, headers=headers)
+                if response.status_code == 200:
+                    body = response.content
+                    digest = _digest(body).digest()
+                    if known is not None and digest == known.digest:
+                        unchanged = "same_body"
+                    else:
+                        store.save_raw(key, body)
+                    _remember(key, response, digest, len(body), True)
+            else:
+                async with session.stream(
+                    "GET", url, params=params, headers=headers
+                ) as response:
+                    if response.status_code == 200:
+                        same, digest, length, complete = await _feed(
+                            response.aiter_content(), consume, known
+                        )
+                        if same:
+                            unchanged = "same_body"
+                        elif read:
+                            store.save_raw(key, b"".join(read), complete)
+                        _remember(key, response, digest, length, complete)
+                    elif response.status_code not in (304, 403, 404):
+                        async for chunk in response.aiter_content():
+                            if consume(chunk):
+                                break
+    except asyncio.CancelledError:
+        guard.finish(None)
+        raise
+    except Exception:
+        guard.finish(True)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_SECONDS.labels(guard.family, "error").observe(elapsed)
+            add_span("upstream", elapsed)
+        raise
+    guard.finish(breaker.is_throttled(response.status_code))
+    elapsed = time.perf_counter() - started
+    UPSTREAM_SECONDS.labels(guard.family, str(response.status_code)).observe(elapsed)
+    add_span("upstream", elapsed)
+
+    if response.status_code == 403:
+        raise HTTPException(status_code=503, detail="Cloudflare is blocking requests.")
+    if response.status_code == 304 and known is not None:
+        unchanged = "not_modified"
+    if unchanged:
+        raise UpstreamUnchanged(unchanged)
+    return response
+
+
+async def fetch_json(url: str, params: dict = None) -> dict:
+    """Fetch JSON from URL using curl-cffi to bypass Cloudflare."""
+    try:
+        response = await _request(url, params)
 
         if response.status_code != 200:
             raise HTTPException(
@@ -34,38 +285,54 @@ async def fetch_json(url: str, params: dict = None) -> dict:
                 detail=f"API returned {response.status_code}",
             )
 
-        return response.json()
+        with span("parse"):
+            return response.json()
 
-    except HTTPException:
+    except (HTTPException, UpstreamUnchanged):
         raise
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Request failed: {str(e)}")
 
 
-async def fetch_html(url: str) -> str:
-    """Fetch HTML content using curl-cffi."""
+async def fetch_bytes(url: str, params: dict = None) -> bytes:
+    """Fetch a raw 200 response body, for parsing off the event loop."""
     try:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: cf_requests.get(
-                url, impersonate="chrome120", headers=config.BMS_HEADERS, timeout=30
-            ),
-        )
+        response = await _request(url, params)
 
-        if response.status_code == 403:
+        if response.status_code != 200:
             raise HTTPException(
-                status_code=503, detail="Cloudflare is blocking requests."
+                status_code=response.status_code,
+                detail=f"API returned {response.status_code}",
             )
 
-        return response.text
+        return response.content
+
+    except (HTTPException, UpstreamUnchanged):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Request failed: {str(e)}")
+
+
+async def stream_html(url: str, consume: ChunkConsumer):
+    """Stream an HTML body into consume(chunk) until it returns True."""
+    try:
+        response = await _request(url, consume=consume)
+        if response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Page not found upstream")
 
-    except HTTPException:
+    except (HTTPException, UpstreamUnchanged):
         raise
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Request failed: {str(e)}")
 
 
 async def close_client():
-    """No cleanup needed for curl-cffi."""
-    pass
+    """Close pooled sessions and their connections."""
+    global _session_cycle, _semaphore
+    sessions = list(_sessions)
+    _sessions.clear()
+    _session_cycle = None
+    _semaphore = None
+    for session in sessions:
+        await session.close()
+        await session.acurl.close()
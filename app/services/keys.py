@@ -0,0 +1,22 @@
+"""
+Canonical forms of request parameters used in cache keys.
+
+``Hyderabad``, ``hyderabad `` and ``HYDERABAD`` are the same page upstream;
+normalizing them before the key is built means they share one cache entry
+(and one upstream fetch) instead of three.
+"""
+
+
+def slug(value: str) -> str:
+    """Region slugs: lowercase, no surrounding whitespace."""
+    return value.strip().lower()
+
+
+def region_code(value: str) -> str:
+    """Region codes: uppercase, no surrounding whitespace."""
+    return value.strip().upper()
+
+
+def query(value: str) -> str:
+    """Search text: lowercase with runs of whitespace collapsed."""
+    return " ".join(value.lower().split())
@@ -0,0 +1,80 @@
+"""
+Optional process pool for CPU-bound parsing and response shaping.
+
+Large upstream payloads are parsed in worker processes so the event loop keeps
+serving other requests (including cache hits) meanwhile. Raw bytes go in and
+results come back orjson-encoded, which is far cheaper to move between
+processes than pickled dicts. Small payloads, and every payload when the pool
+is disabled, are handled inline.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+import orjson
+from app.core import config
+from app.core.metrics import CPU_POOL_PENDING
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _create_pool() -> ProcessPoolExecutor:
+    # Forking a process that runs an event loop and native HTTP sessions is unsafe.
+    return ProcessPoolExecutor(
+        max_workers=config.CPU_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _packed(func: Callable, data: bytes, *args) -> bytes:
+    return orjson.dumps(func(data, *args))
+
+
+def start_pool():
+    """Start the worker pool if one is configured."""
+    global _pool
+    if config.CPU_POOL_WORKERS > 0 and _pool is None:
+        _pool = _create_pool()
+
+
+async def offload(func: Callable, data: bytes, *args) -> Any:
+    """Run func(data, *args), in the pool when data is large enough.
+
+    func must be a module-level function returning JSON-serializable data.
+    """
+    global _pool
+    pool = _pool
+    if pool is None or len(data) < config.CPU_POOL_THRESHOLD:
+        with span("parse"):
+            return func(data, *args)
+
+    loop = asyncio.get_running_loop()
+    CPU_POOL_PENDING.inc()
+    try:
+        # Queueing, the work itself and moving data to and from the pool.
+        with span("cpu-pool"):
+            packed = await loop.run_in_executor(pool, _packed, func, data, *args)
+    except BrokenProcessPool:
+        if _pool is pool:
+            logger.warning("CPU pool worker died; restarting the pool")
+            pool.shutdown(wait=False)
+            _pool = _create_pool()
+        with span("parse"):
+            return func(data, *args)
+    finally:
+        CPU_POOL_PENDING.dec()
+    return orjson.loads(packed)
+
+
+async def close_pool():
+    """Shut down the worker pool."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
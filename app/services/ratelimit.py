@@ -0,0 +1,175 @@
+"""
+Per-API-key rate limiting, shared by every worker and node.
+
+Each API key has a token bucket in Redis, refilled at its quota's rate and
+holding at most one window's worth of tokens. One Lua call per request
+refills and takes tokens atomically, using Redis's clock so workers on
+different hosts agree.
+
+When a bucket is more than half full, the call also leases a few extra
+tokens to the calling worker, which spends them locally without asking
+Redis. A lease lapses after RATE_LIMIT_LEASE_TTL and whatever is left of it
+is handed back on the worker's next call, so leasing never lets a key past
+its quota and rarely costs it tokens.
+
+While Redis is unavailable, each worker enforces its share (1/WORKERS) of
+every quota locally.
+"""
+
+import hashlib
+import math
+import time
+from typing import Dict, Tuple
+from fastapi import Depends, HTTPException
+from app.core import config
+from app.core.context import set_response_header
+from app.core.security import verify_api_key
+from app.core.tracing import span
+from app.services.cache import available_redis
+
+_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_MAX_LOCAL_KEYS = 10000
+
+# Refill (plus tokens handed back from a lapsed lease), then take cost
+# tokens, and a lease too when the bucket is over half full. Returns
+# {granted, tokens left, ms until cost tokens are available}.
+_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local lease = tonumber(ARGV[4])
+local refund = tonumber(ARGV[5])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = tokens + math.max(0, now - at) * rate / 1000 + refund
+tokens = math.min(burst, tokens)
+local granted = 0
+if tokens - cost - lease >= burst / 2 then
+    granted = cost + lease
+elseif tokens >= cost then
+    granted = cost
+end
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((cost - tokens) / rate * 1000)
+end
+return {granted, math.floor(tokens), wait}
+"""
+
+
+def parse_limit(text: str) -> Tuple[float, float]:
+    """``"100/minute"`` -> (tokens per second, bucket size)."""
+    count, _, unit = text.strip().partition("/")
+    unit = unit.strip().lower().rstrip("s")
+    if unit not in _UNITS:
+        raise ValueError(f"Unknown rate limit unit in {text!r}")
+    amount = float(count)
+    return amount / _UNITS[unit], amount
+
+
+_default = parse_limit(config.RATE_LIMIT)
+_quotas = {key: parse_limit(limit) for key, limit in config.RATE_LIMITS.items()}
+
+# bucket -> (leased tokens left, lease expiry, tokens left in Redis)
+_leases: Dict[str, Tuple[float, float, int]] = {}
+# bucket -> (tokens, updated) while Redis is unavailable
+_local: Dict[str, Tuple[float, float]] = {}
+
+
+def quota(api_key: str) -> Tuple[float, float]:
+    """(tokens per second, bucket size) for an API key."""
+    return _quotas.get(api_key, _default)
+
+
+def _bucket(api_key: str) -> str:
+    digest = hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+    return f"ratelimit:{digest}"
+
+
+def _prune(table: dict, alive):
+    if len(table) > _MAX_LOCAL_KEYS:
+        for key in [k for k, v in table.items() if not alive(v)]:
+            del table[key]
+
+
+def _take_local(bucket: str, rate: float, burst: float, cost: int):
+    """Worker-local bucket with this worker's share of the quota."""
+    share = max(1, config.WORKERS)
+    rate, burst = rate / share, max(1.0, burst / share)
+    now = time.monotonic()
+    _prune(_local, lambda v: now - v[1] < burst / rate)
+    tokens, updated = _local.get(bucket, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        _local[bucket] = (tokens - cost, now)
+        return True, int(tokens - cost), 0.0
+    _local[bucket] = (tokens, now)
+    return False, int(tokens), (cost - tokens) / rate
+
+
+async def acquire(api_key: str, cost: int = 1) -> Tuple[bool, int, float]:
+    """Take cost tokens for a key: (allowed, remaining, seconds to wait if not)."""
+    rate, burst = quota(api_key)
+    bucket = _bucket(api_key)
+    now = time.monotonic()
+
+    lease = _leases.get(bucket)
+    if lease is not None and lease[1] > now and lease[0] >= cost:
+        _leases[bucket] = (lease[0] - cost, lease[1], lease[2])
+        return True, lease[2] + int(lease[0] - cost), 0.0
+
+    r = await available_redis()
+    if r is None:
+        return _take_local(bucket, rate, burst, cost)
+    # Hand back what is left of a lease that lapsed (or is too small).
+    refund = _leases.pop(bucket, (0, 0.0, 0))[0]
+    try:
+        granted, left, wait = await r.eval(
+            _TAKE, 1, bucket, rate, burst, cost, config.RATE_LIMIT_LEASE, refund
+        )
+    except Exception:
+        return _take_local(bucket, rate, burst, cost)
+
+    held = _leases.get(bucket)
+    if granted == 0:
+        # A concurrent call from this worker may have leased tokens meanwhile.
+        if held is not None and held[0] >= cost:
+            _leases[bucket] = (held[0] - cost, held[1], held[2])
+            return True, int(left) + int(held[0] - cost), 0.0
+        return False, int(left), wait / 1000
+    extra = granted - cost
+    if held is not None:
+        # Concurrent calls from this worker each took a lease; pool them.
+        extra += held[0]
+    if extra > 0:
+        _prune(_leases, lambda v: v[1] > now)
+        _leases[bucket] = (extra, now + config.RATE_LIMIT_LEASE_TTL, left)
+    return True, int(left) + granted - cost, 0.0
+
+
+async def charge(api_key: str, cost: int = 1):
+    """Spend cost tokens for a key, raising 429 when it is over its quota."""
+    if cost <= 0:
+        return
+    with span("ratelimit"):
+        allowed, remaining, wait = await acquire(api_key, cost)
+    set_response_header("X-RateLimit-Limit", str(int(quota(api_key)[1])))
+    set_response_header("X-RateLimit-Remaining", str(max(0, remaining)))
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded.",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+async def rate_limit(api_key: str = Depends(verify_api_key)) -> str:
+    """Dependency: authenticate the request and charge it to its API key."""
+    await charge(api_key)
+    return api_key
@@ -0,0 +1,178 @@
+"""
+Region resolution: any way of naming a region to its code or slug.
+
+``/theaters`` wants a region code and ``/now-showing`` a slug, but clients
+send either, an alias ("Bombay"), the display name, or a typo. Each worker
+keeps an index over the cached regions list, rebuilt when its ETag changes,
+that matches codes, slugs, names and aliases ignoring case and punctuation,
+then falls back to trigram similarity. A value matching no region is
+rejected with 404 before anything is fetched, so bad input can't turn into
+upstream scrapes.
+
+Resolution is synchronous, so it serves as the region normalizer of cache
+keys. Until the regions list has been loaded once (or with
+REGION_VALIDATE off) unknown values pass through as given.
+"""
+
+import asyncio
+import logging
+import re
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from app.core import config
+from app.services import keys
+
+logger = logging.getLogger(__name__)
+
+_NOT_ALNUM = re.compile(r"[^a-z0-9]+")
+_MAX_MEMO = 4096  # resolved values remembered per index
+_SUGGEST_MIN = 0.3  # similarity for "did you mean" hints
+
+_source: Optional[Callable] = None
+_index: Optional["RegionIndex"] = None
+_task: Optional[asyncio.Task] = None
+
+
+def register_source(func: Callable):
+    """Set the ``cached`` function that returns ``{"regions": [...]}``."""
+    global _source
+    _source = func
+
+
+def _compact(text: str) -> str:
+    return _NOT_ALNUM.sub("", text.lower())
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f" {text} "
+    return set(map("".join, zip(padded, padded[1:], padded[2:])))
+
+
+class RegionIndex:
+    """Regions by every compacted name they go by, with trigram postings."""
+
+    def __init__(self, regions: List[dict], etag: str = ""):
+        self.etag = etag
+        self._names: Dict[str, dict] = {}
+        # Earlier passes win collisions: a code beats another region's alias.
+        for field in ("code", "slug", "name", "alias"):
+            for region in regions:
+                for value in re.split(r"[,/|]", region.get(field) or ""):
+                    name = _compact(value)
+                    if name:
+                        self._names.setdefault(name, region)
+        self._grams = {name: _trigrams(name) for name in self._names}
+        self._postings: Dict[str, Set[str]] = {}
+        for name, grams in self._grams.items():
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(name)
+        self._memo: Dict[str, Optional[dict]] = {}
+
+    def __len__(self) -> int:
+        return len({id(region) for region in self._names.values()})
+
+    def similar(self, value: str) -> List[Tuple[float, dict]]:
+        """(similarity, region) by trigram Dice coefficient, best first, one per region."""
+        grams = _trigrams(value)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        best: Dict[int, Tuple[float, dict]] = {}
+        for name, count in shared.items():
+            score = 2 * count / (len(grams) + len(self._grams[name]))
+            region = self._names[name]
+            if score > best.get(id(region), (0.0,))[0]:
+                best[id(region)] = (score, region)
+        return sorted(best.values(), key=lambda match: -match[0])
+
+    def find(self, value: str) -> Optional[dict]:
+        """The region a value names, or None if it matches none unambiguously."""
+        name = _compact(value)
+        if name in self._memo:
+            return self._memo[name]
+        region = self._names.get(name)
+        if region is None and name:
+            matches = self.similar(name)
+            if matches and matches[0][0] >= config.REGION_FUZZY_MIN:
+                # A near-tie between two regions is a guess; don't make it.
+                if len(matches) == 1 or matches[1][0] < matches[0][0] - 0.05:
+                    region = matches[0][1]
+        if len(self._memo) >= _MAX_MEMO:
+            self._memo.clear()
+        self._memo[name] = region
+        return region
+
+
+def _resolve(value: str, field: str, fallback: Callable[[str], str]) -> str:
+    index = _index
+    if index is None:
+        return fallback(value)
+    region = index.find(value)
+    if region is not None and region.get(field):
+        return region[field]
+    if not config.REGION_VALIDATE:
+        return fallback(value)
+    hints = [
+        r["name"]
+        for score, r in index.similar(_compact(value))[:3]
+        if score >= _SUGGEST_MIN
+    ]
+    detail = f"Unknown region: {value.strip()!r}."
+    if hints:
+        detail += f" Did you mean {', '.join(hints)}?"
+    raise HTTPException(status_code=404, detail=detail)
+
+
+def code(value: str) -> str:
+    """The region code for any name of a region; 404 if it names none."""
+    return _resolve(value, "code", keys.region_code)
+
+
+def slug(value: str) -> str:
+    """The region slug for any name of a region; 404 if it names none."""
+    return _resolve(value, "slug", keys.slug)
+
+
+async def load():
+    """Rebuild the index if the cached regions list has changed."""
+    global _index
+    if _source is None:
+        return
+    entry = await _source.entry()
+    if _index is not None and _index.etag == entry.etag:
+        return
+    regions = entry.value.get("regions", [])
+    if not regions:
+        return  # an empty list would reject every region
+    _index = RegionIndex(regions, entry.etag)
+    logger.info("Region index built with %d regions", len(_index))
+
+
+async def _run():
+    while True:
+        try:
+            await load()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Region index could not load regions: %s", e)
+        await asyncio.sleep(config.REGION_INDEX_REFRESH)
+
+
+def start_region_index():
+    """Load the regions list now and keep the index current."""
+    global _task
+    if _task is None:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_region_index():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
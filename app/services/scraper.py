@@ -1,132 +1,378 @@
 """
 Scraper service for parsing HTML content.
+
+Movie pages are parsed in a single pass with precompiled patterns. The parser
+can be fed the body incrementally as it arrives and reports when it has seen
+enough (an embedded JSON state blob, or the end of the movie grid), so the
+rest of the download can be skipped.
 """
 
-import re
+import codecs
 import json
-from typing import List, Dict
-from app.services.http_client import fetch_html
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import orjson
+from app.core.metrics import PARSE_MOVIES, PARSE_SECONDS
+from app.core.tracing import add_span
+from app.services.http_client import stream_html
 
+# Bare movie paths (and ET codes) are collected only until the first card
+# link shows up; from there on, card links are all that matter.
+_LINK_PREFIX = 'href="'
+_LINK_PREFIX_LEN = len(_LINK_PREFIX)
+_LINK = re.compile(r'href="/movies/([^/"]+)/(ET\d+)"')
+_CARD = 'href="/movies/'
+_ANCHOR = re.compile("/movies/")
+_ANCHOR_LEN = len("/movies/")
+_PATH = re.compile(r'/movies/([a-z0-9-]+)(?:/|")')
+_ET = re.compile(r"ET\d{8}")
 
-async def scrape_movies_page(url: str) -> str:
-    """Fetch a movies page HTML content."""
-    return await fetch_html(url)
+_LD_MARKER = '<script type="application/ld+json">'
+_LD_MARKER_LEN = len(_LD_MARKER)
+# Both state blob openings share a "__NAME__" core that is cheap to scan for;
+# the full opening is then matched around each hit.
+_STATE_NAME = re.compile(r"__(?:INITIAL_STATE|NEXT_DATA)__")
+_STATE_START = re.compile(
+    r'window\.__INITIAL_STATE__\s*=|<script id="__NEXT_DATA__"[^>]*>'
+)
+_STATE_PREFIX_MAX = len('<script id="')
+_STATE_MARKER = "state"
+_FOOTER = "<footer"
+_FOOTER_LEN = len(_FOOTER)
+_SCRIPT_END = "</script>"
+_SCRIPT_END_LEN = len(_SCRIPT_END)
+_STATE_URL = re.compile(r"/movies/(?:[^/\"]+/)?([a-z0-9-]+)/(ET\d+)")
 
+# Tokens never span more than this, so a streamed buffer only needs to keep
+# this much unscanned text between chunks.
+_MAX_TOKEN = 512
+_SECONDARY_LIMIT = 30
+_NOT_MOVIES = frozenset(["upcoming", "now-playing", "coming-soon", "movies"])
 
-def parse_movies_from_html(html: str, movie_type: str) -> List[Dict]:
-    """Parse movie data from HTML content."""
-    movies = []
-    seen_ids = set()
 
-    # Primary pattern: Extract from movie card links /movies/{slug}/{id}
-    movie_links = re.findall(r'href="/movies/([^/]+)/(ET\d+)"', html)
+async def scrape_movies(url: str, movie_type: str) -> List[Dict]:
+    """Stream a movies page through the parser, stopping once it has enough.
 
-    for slug, movie_id in movie_links:
-        if movie_id in seen_ids:
-            continue
-        seen_ids.add(movie_id)
-
-        # Try to find the movie name nearby in the HTML
-        name = slug.replace("-", " ").title()
-
-        movies.append(
-            {
-                "id": movie_id,
-                "name": name,
-                "slug": slug,
-                "type": movie_type,
-                "poster": (
-                    f"https://assets-in.bmscdn.com/discovery-catalog/events/"
-                    f"tr:w-400,h-600,bg-CCCCCC/{movie_id.lower()}-portrait.jpg"
-                ),
-                "booking_url": f"https://in.bookmyshow.com/movies/{slug}/{movie_id}",
-            }
-        )
-
-    # Secondary pattern: Extract from paths like /movies/{slug} with ET code nearby
-    if not movies:
-        # Find all movie slugs and ET codes
-        movie_slugs = re.findall(r'/movies/([a-z0-9-]+)(?:/|")', html)
-        et_codes = re.findall(r"(ET\d{8})", html)
-
-        # Create unique sets
-        unique_slugs = list(dict.fromkeys(movie_slugs))[:30]  # Keep order, limit to 30
-        unique_et_codes = list(dict.fromkeys(et_codes))
-
-        # Match slugs with ET codes (they appear in same order)
-        for i, slug in enumerate(unique_slugs):
-            if slug in ["upcoming", "now-playing", "coming-soon", "movies"]:
+    Parsing happens chunk by chunk as the body arrives, so it never holds the
+    event loop for long; use parse_movies_from_html() for a complete document.
+    """
+    parser = MovieParser(movie_type)
+    spent = 0.0
+
+    def feed(chunk: bytes) -> bool:
+        nonlocal spent
+        started = time.perf_counter()
+        done = parser.feed(chunk)
+        spent += time.perf_counter() - started
+        return done
+
+    await stream_html(url, feed)
+    started = time.perf_counter()
+    movies = parser.close()
+    spent += time.perf_counter() - started
+    PARSE_SECONDS.labels("stream").observe(spent)
+    add_span("parse", spent)
+    PARSE_MOVIES.labels("stream").observe(len(movies))
+    return movies
+
+
+def _movie(slug: str, movie_id: str, movie_type: str) -> Dict:
+    return {
+        "id": movie_id,
+        "name": slug.replace("-", " ").title(),
+        "slug": slug,
+        "type": movie_type,
+        "poster": (
+            f"https://assets-in.bmscdn.com/discovery-catalog/events/"
+            f"tr:w-400,h-600,bg-CCCCCC/{movie_id.lower()}-portrait.jpg"
+        ),
+        "booking_url": f"https://in.bookmyshow.com/movies/{slug}/{movie_id}",
+    }
+
+
+def _find_footer(buf: str, start: int, end: int) -> int:
+    """Position of the first ``<footer`` tag starting in [start, end), or -1."""
+    i = buf.find(_FOOTER, start, end)
+    while i >= 0:
+        after = i + _FOOTER_LEN
+        if after >= len(buf) or not (buf[after].isalnum() or buf[after] == "_"):
+            return i
+        i = buf.find(_FOOTER, after, end)
+    return -1
+
+
+def _state_pairs(node) -> Iterator[Tuple[str, str]]:
+    """Yield (slug, ET id) pairs from a JSON state blob, in document order."""
+    if isinstance(node, dict):
+        code = node.get("eventCode") or node.get("EventCode")
+        slug = node.get("eventSlug") or node.get("slug")
+        if isinstance(code, str) and isinstance(slug, str) and code.startswith("ET"):
+            yield slug, code
+        for value in node.values():
+            yield from _state_pairs(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _state_pairs(value)
+    elif isinstance(node, str) and "/movies/" in node:
+        for match in _STATE_URL.finditer(node):
+            yield match.group(1), match.group(2)
+
+
+class MovieParser:
+    """Incremental, single-pass movie extractor.
+
+    ``feed()`` accepts str or bytes chunks and returns True once the page has
+    been read far enough; ``close()`` returns the movies. Output matches the
+    link / path+code / JSON-LD strategies of the original parser, but an
+    embedded JSON state blob is preferred when the page has one.
+    """
+
+    def __init__(self, movie_type: str):
+        self.movie_type = movie_type
+        self.done = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+        # Unscanned text. Tokens starting before _from were handled already
+        # (the text is kept as look-behind); path scanning resumes at _resume.
+        self._buf = ""
+        self._from = 0
+        self._resume = 0
+
+        self._linked: Dict[str, str] = {}  # ET id -> slug, from card links
+        self._slugs: Dict[str, None] = {}  # ordered set of bare paths
+        self._has_slug = False  # a bare path that is not a listing page
+        self._codes: Dict[str, None] = {}  # ordered set of ET codes
+        self._json_ld: List[str] = []
+        self._state: List[Tuple[str, str]] = []
+
+        # Script block still arriving: (kind, parts so far)
+        self._script: Optional[Tuple[str, List[str]]] = None
+        self._script_tail = ""
+
+    def feed(self, chunk: Union[str, bytes]) -> bool:
+        if self.done:
+            return True
+        text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        self._scan(text, final=False)
+        return self.done
+
+    def close(self, chunk: Union[str, bytes] = b"") -> List[Dict]:
+        """Feed the last chunk (if any) and return the movies."""
+        if not self.done:
+            if isinstance(chunk, bytes):
+                chunk = self._decoder.decode(chunk, final=True)
+            self._scan(chunk, final=True)
+        self.done = True
+        return self._result()
+
+    def _scan(self, text: str, final: bool):
+        start = self._from
+        if self._script is not None:
+            after = self._capture(text)
+            if self.done:
+                return
+            start = len(self._buf) + after if after >= 0 else None
+
+        buf = self._buf + text
+        end = len(buf) if final else len(buf) - _MAX_TOKEN
+        if end <= self._from:
+            self._buf = buf
+            return
+
+        footer = -1
+        scripts_end = None
+        pos, first = self._resume, -1
+        if not self._linked:
+            pos, first = self._scan_paths(buf, pos, end)
+            if first < 0:
+                scripts_end = end
+                for match in _ET.finditer(buf, self._from, len(buf)):
+                    if match.start() >= end:
+                        break
+                    self._codes[match.group()] = None
+            else:
+                # A state blob is only preferred if it precedes the grid.
+                scripts_end = pos = first
+        if self._linked or first >= 0:
+            pos, footer = self._scan_links(buf, pos, end, final)
+
+        if start is not None and scripts_end is not None and start < scripts_end:
+            self._scan_scripts(buf, start, scripts_end)
+        if self.done or footer >= 0:
+            self.done = True
+            return
+
+        if final:
+            self._buf = ""
+            return
+        keep_from = max(0, end - _LINK_PREFIX_LEN)
+        self._buf = buf[keep_from:]
+        self._from = end - keep_from
+        self._resume = pos - keep_from
+
+    def _scan_links(self, buf: str, pos: int, end: int, final: bool) -> Tuple[int, int]:
+        """Collect card links from pos on.
+
+        Returns where scanning should resume and, when streaming, the position
+        of a footer after the last link (or -1): the grid is over by then.
+        """
+        linked = self._linked
+        for slug, movie_id in _LINK.findall(buf, pos):
+            linked.setdefault(movie_id, slug)
+        if final:
+            return end, -1
+        # Links are matched whole, so rescanning from end only finds repeats.
+        last = buf.rfind(_CARD, pos, end)
+        return end, _find_footer(buf, max(pos, last), end)
+
+    def _scan_paths(self, buf: str, pos: int, end: int) -> Tuple[int, int]:
+        """Collect bare movie paths starting before end, up to the first card link.
+
+        Returns where scanning should resume and the card link position (or -1).
+        """
+        search = _ANCHOR.search
+        slugs = self._slugs
+        limit = min(len(buf), end + _ANCHOR_LEN - 1)
+        while True:
+            hit = search(buf, pos, limit)
+            if hit is None:
+                return max(pos, end), -1
+            at = hit.start()
+            link = at - _LINK_PREFIX_LEN
+            if (
+                link >= 0
+                and buf.startswith(_LINK_PREFIX, link)
+                and _LINK.match(buf, link)
+            ):
+                return at, link
+            path = _PATH.match(buf, at)
+            if path is None:
+                pos = at + 1
                 continue
-            movie_id = (
-                unique_et_codes[i] if i < len(unique_et_codes) else f"UNKNOWN-{i}"
-            )
-            if movie_id in seen_ids:
+            slug = path.group(1)
+            if slug not in slugs:
+                slugs[slug] = None
+                self._has_slug = self._has_slug or slug not in _NOT_MOVIES
+            pos = path.end()
+
+    def _scan_scripts(self, buf: str, start: int, end: int):
+        """Capture state blobs (and JSON-LD while it may still be needed)."""
+        hits = []
+        for match in _STATE_NAME.finditer(buf, start, end):
+            begin = max(0, match.start() - _STATE_PREFIX_MAX)
+            opening = _STATE_START.search(buf, begin, match.end() + _MAX_TOKEN)
+            if opening is not None and opening.start() <= match.start():
+                hits.append((opening.start(), opening.end(), False))
+        if not self._linked and not self._has_slug:
+            i = buf.find(_LD_MARKER, start, end + _LD_MARKER_LEN - 1)
+            while i >= 0:
+                hits.append((i, i + _LD_MARKER_LEN, True))
+                i = buf.find(_LD_MARKER, i + _LD_MARKER_LEN, end + _LD_MARKER_LEN - 1)
+
+        after = start
+        for begin, content, is_ld in sorted(hits):
+            if begin < after:
+                continue  # inside the previous script
+            marker = _LD_MARKER if is_ld else _STATE_MARKER
+            close = buf.find(_SCRIPT_END, content)
+            if close < 0:
+                self._script = (marker, [buf[content:]])
+                self._script_tail = buf[-_SCRIPT_END_LEN:]
+                return
+            self._script_done(marker, buf[content:close])
+            if self.done:
+                return
+            after = close + _SCRIPT_END_LEN
+
+    def _capture(self, text: str) -> int:
+        """Continue a script capture; return the offset in text after it ends."""
+        marker, parts = self._script
+        window = self._script_tail + text
+        end = window.find(_SCRIPT_END)
+        parts.append(text)
+        if end < 0:
+            self._script_tail = window[-_SCRIPT_END_LEN:]
+            return -1
+
+        # window is a suffix of everything captured so far.
+        captured = "".join(parts)
+        self._script = None
+        self._script_done(marker, captured[: len(captured) - len(window) + end])
+        return end - len(self._script_tail) + _SCRIPT_END_LEN
+
+    def _script_done(self, marker: str, body: str):
+        if marker == _LD_MARKER:
+            self._json_ld.append(body)
+            return
+        try:
+            state = orjson.loads(body.strip().rstrip(";"))
+        except orjson.JSONDecodeError:
+            return
+        self._state = list(_state_pairs(state))
+        if self._state:
+            self.done = True
+
+    def _result(self) -> List[Dict]:
+        movie_type = self.movie_type
+        seen = set()
+        movies = []
+
+        for slug, movie_id in self._state:
+            if movie_id not in seen:
+                seen.add(movie_id)
+                movies.append(_movie(slug, movie_id, movie_type))
+        if movies:
+            return movies
+        if self._linked:
+            return [_movie(s, i, movie_type) for i, s in self._linked.items()]
+
+        # Bare /movies/{slug} paths paired by position with ET codes.
+        codes = list(self._codes)
+        for i, slug in enumerate(list(self._slugs)[:_SECONDARY_LIMIT]):
+            if slug in _NOT_MOVIES:
                 continue
-            seen_ids.add(movie_id)
-
-            name = slug.replace("-", " ").title()
-            movies.append(
-                {
-                    "id": movie_id,
-                    "name": name,
-                    "slug": slug,
-                    "type": movie_type,
-                    "poster": (
-                        f"https://assets-in.bmscdn.com/discovery-catalog/events/"
-                        f"tr:w-400,h-600,bg-CCCCCC/{movie_id.lower()}-portrait.jpg"
-                    ),
-                    "booking_url": f"https://in.bookmyshow.com/movies/{slug}/{movie_id}",
-                }
-            )
-
-    # Fallback: Try JSON-LD data
-    if not movies:
-        json_ld_pattern = r'<script type="application/ld\+json">(.*?)</script>'
-        json_matches = re.findall(json_ld_pattern, html, re.DOTALL)
-
-        for json_str in json_matches:
-            try:
-                data = json.loads(json_str)
-                if isinstance(data, dict) and data.get("@type") == "Movie":
-                    movie_id = data.get("identifier", "")
-                    if movie_id and movie_id not in seen_ids:
-                        seen_ids.add(movie_id)
-                        movies.append(
-                            {
-                                "id": movie_id,
-                                "name": data.get("name", ""),
-                                "slug": (
-                                    data.get("url", "").split("/")[-2]
-                                    if data.get("url")
-                                    else ""
-                                ),
-                                "type": movie_type,
-                            }
-                        )
-                elif isinstance(data, list):
-                    for item in data:
-                        if isinstance(item, dict) and item.get("@type") == "Movie":
-                            movie_id = item.get("identifier", "")
-                            if movie_id and movie_id not in seen_ids:
-                                seen_ids.add(movie_id)
-                                movies.append(
-                                    {
-                                        "id": movie_id,
-                                        "name": item.get("name", ""),
-                                        "slug": (
-                                            item.get("url", "").split("/")[-2]
-                                            if item.get("url")
-                                            else ""
-                                        ),
-                                        "type": movie_type,
-                                    }
-                                )
-            except json.JSONDecodeError:
-                pass
+            movie_id = codes[i] if i < len(codes) else f"UNKNOWN-{i}"
+            if movie_id not in seen:
+                seen.add(movie_id)
+                movies.append(_movie(slug, movie_id, movie_type))
+        if movies:
+            return movies
+
+        return _parse_json_ld(self._json_ld, movie_type)
 
+
+def _parse_json_ld(blocks: List[str], movie_type: str) -> List[Dict]:
+    movies = []
+    seen = set()
+    for block in blocks:
+        try:
+            data = json.loads(block)
+        except json.JSONDecodeError:
+            continue
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            if not isinstance(item, dict) or item.get("@type") != "Movie":
+                continue
+            movie_id = item.get("identifier", "")
+            if movie_id and movie_id not in seen:
+                seen.add(movie_id)
+                url = item.get("url")
+                movies.append(
+                    {
+                        "id": movie_id,
+                        "name": item.get("name", ""),
+                        "slug": url.split("/")[-2] if url else "",
+                        "type": movie_type,
+                    }
+                )
     return movies
 
 
-async def close_pool():
-    """No cleanup needed."""
-    pass
+def parse_movies_from_html(html: Union[str, bytes], movie_type: str) -> List[Dict]:
+    """Parse movie data from HTML content."""
+    started = time.perf_counter()
+    movies = MovieParser(movie_type).close(html)
+    PARSE_SECONDS.labels("document").observe(time.perf_counter() - started)
+    PARSE_MOVIES.labels("document").observe(len(movies))
+    return movies
@@ -0,0 +1,147 @@
+"""
+Versioned list snapshots and deltas between them.
+
+Every cache entry carries a version that increases whenever its body
+changes. For list resources (movies, venues) the version a client was sent
+is recorded as a map of item key -> item hash in Redis, so a later request
+with ``?since=<version>`` can be answered with just the items added, removed
+or changed since then instead of the whole list. Only the last
+SNAPSHOT_HISTORY versions of each key are kept, for SNAPSHOT_RETENTION
+seconds; a client holding an older version gets the full list again.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import orjson
+from fastapi import Request, Response
+from app.core import config
+from app.services.cache import CacheEntry, available_redis, freshness, http_response
+
+_MAX_LOCAL = 512  # (key, version) digest maps kept per worker
+
+# (cache key, version) -> {item key: item hash}
+_digests: "OrderedDict[Tuple[str, int], Dict[str, str]]" = OrderedDict()
+
+
+def _item_hash(item: dict) -> str:
+    raw = orjson.dumps(item, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def _remember(key: str, version: int, digests: Dict[str, str]):
+    _digests[(key, version)] = digests
+    _digests.move_to_end((key, version))
+    while len(_digests) > _MAX_LOCAL:
+        _digests.popitem(last=False)
+
+
+def digest(entry: CacheEntry, field: str, item_key: str) -> Dict[str, str]:
+    """Item key -> item hash for the list in an entry."""
+    return {
+        str(item[item_key]): _item_hash(item)
+        for item in entry.value.get(field, [])
+        if item.get(item_key)
+    }
+
+
+async def record(key: str, entry: CacheEntry, field: str, item_key: str):
+    """Make the entry's version available as a base for later deltas."""
+    if (key, entry.version) in _digests:
+        return
+    digests = digest(entry, field, item_key)
+    _remember(key, entry.version, digests)
+    r = await available_redis()
+    if r is None:
+        return
+    name = f"snapshots:{key}"
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.hsetnx(name, str(entry.version), orjson.dumps(digests))
+            pipe.expire(name, config.SNAPSHOT_RETENTION)
+            pipe.hkeys(name)
+            *_, versions = await pipe.execute()
+        if len(versions) > config.SNAPSHOT_HISTORY:
+            old = sorted(versions, key=int)[: len(versions) - config.SNAPSHOT_HISTORY]
+            await r.hdel(name, *old)
+    except Exception:
+        pass
+
+
+async def _load(key: str, version: int) -> Optional[Dict[str, str]]:
+    digests = _digests.get((key, version))
+    if digests is not None:
+        return digests
+    r = await available_redis()
+    if r is None:
+        return None
+    try:
+        raw = await r.hget(f"snapshots:{key}", str(version))
+    except Exception:
+        return None
+    if not raw:
+        return None
+    digests = orjson.loads(raw)
+    _remember(key, version, digests)
+    return digests
+
+
+async def delta(
+    key: str, entry: CacheEntry, since: int, field: str, item_key: str
+) -> Optional[dict]:
+    """What changed in the entry's list since a version, or None if unknown."""
+    base = await _load(key, since)
+    if base is None:
+        return None
+    current = _digests.get((key, entry.version)) or digest(entry, field, item_key)
+    added, changed = [], []
+    for item in entry.value.get(field, []):
+        k = str(item.get(item_key) or "")
+        if not k:
+            continue
+        if k not in base:
+            added.append(item)
+        elif base[k] != current[k]:
+            changed.append(item)
+    result = {k: v for k, v in entry.value.items() if k != field}
+    result.update(
+        {
+            "version": entry.version,
+            "since": since,
+            "added": added,
+            "changed": changed,
+            "removed": [k for k in base if k not in current],
+        }
+    )
+    return result
+
+
+async def respond(
+    func: Callable,
+    request: Request,
+    since: Optional[int],
+    field: str,
+    item_key: str,
+    **kwargs,
+) -> Response:
+    """Serve a cached list in full, or as a delta from ``since`` when possible.
+
+    func is a ``cached`` function returning a dict with the list in field;
+    items are matched across versions by item_key.
+    """
+    entry = await func.response_entry(**kwargs)
+    key = func.cache_key(**kwargs)
+    await record(key, entry, field, item_key)
+    if since is not None and since <= entry.version:
+        changes = await delta(key, entry, since, field, item_key)
+        if changes is not None:
+            return Response(
+                orjson.dumps(changes),
+                media_type="application/json",
+                headers={
+                    "Cache-Control": freshness(entry),
+                    "X-Version": str(entry.version),
+                    "X-Delta": "true",
+                },
+            )
+    return http_response(entry, request)
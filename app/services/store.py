@@ -0,0 +1,262 @@
+"""
+Last-known-good store: the latest cache entries and upstream bodies on disk.
+
+Every entry the cache writes, and every upstream body fetched, is also kept in
+a local SQLite file (STORE_PATH). Writes are queued in memory and flushed in
+batches by a background task on a dedicated thread, so the request path only
+pays for a dict insert; writes to the same key between flushes collapse into
+the last one.
+
+The store is read lazily, one key at a time. When a key is in neither L1 nor
+Redis (a cold start after Redis lost its data, or while Redis is down) the
+cache looks here before going upstream and serves what it finds within its
+hard TTL. When upstream fails too, whatever is stored is served as stale
+regardless of age.
+
+Raw bodies are kept per URL, so a parser fix can be re-run over the pages that
+were actually fetched; see ``raw_bodies``. Rows not rewritten for
+STORE_MAX_AGE seconds are pruned. Workers of one host share the file.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+# body, meta, gz, br: the cache's Redis hash fields
+EntryRow = Tuple[bytes, bytes, bytes, bytes]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    meta BLOB NOT NULL,
+    gz BLOB NOT NULL,
+    br BLOB NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS raw (
+    url TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    complete INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+_PRUNE_EVERY = 3600  # seconds between prunes
+
+_disabled = not config.STORE_PATH
+_conn: Optional[sqlite3.Connection] = None  # only touched on _executor's thread
+_executor: Optional[ThreadPoolExecutor] = None
+_last_prune = 0.0
+
+# Queued writes: key -> row (None deletes), url -> (body, complete, fetched_at)
+_pending_entries: Dict[str, Optional[EntryRow]] = {}
+_pending_raw: Dict[str, Tuple[bytes, bool, float]] = {}
+_wakeup: Optional[asyncio.Event] = None
+_writer: Optional[asyncio.Task] = None
+_loading: Dict[str, asyncio.Future] = {}
+_stats: Counter = Counter()
+
+
+def enabled() -> bool:
+    return not _disabled
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    global _conn, _disabled
+    if _conn is None and not _disabled:
+        try:
+            directory = os.path.dirname(config.STORE_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(config.STORE_PATH, timeout=config.STORE_BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _conn = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Store disabled: cannot open %s: %s", config.STORE_PATH, e)
+            _disabled = True
+    return _conn
+
+
+def _write(entries: Dict[str, Optional[EntryRow]], raw: Dict[str, tuple]):
+    global _last_prune
+    conn = _connect()
+    if conn is None:
+        return
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, *row, now) for key, row in entries.items() if row is not None],
+        )
+        conn.executemany(
+            "DELETE FROM entries WHERE key = ?",
+            [(key,) for key, row in entries.items() if row is None],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO raw VALUES (?, ?, ?, ?)",
+            [(url, body, int(done), at) for url, (body, done, at) in raw.items()],
+        )
+        if now - _last_prune >= _PRUNE_EVERY:
+            _last_prune = now
+            cutoff = now - config.STORE_MAX_AGE
+            conn.execute("DELETE FROM entries WHERE written_at < ?", (cutoff,))
+            conn.execute("DELETE FROM raw WHERE fetched_at < ?", (cutoff,))
+
+
+def _read_entry(key: str) -> Optional[EntryRow]:
+    conn = _connect()
+    if conn is None:
+        return None
+    return conn.execute(
+        "SELECT body, meta, gz, br FROM entries WHERE key = ?", (key,)
+    ).fetchone()
+
+
+def _close():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def _in_thread(func: Callable, *args) -> asyncio.Future:
+    # One thread owns the connection, so reads queue behind pending writes.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(1, thread_name_prefix="store")
+    return asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def _flush():
+    global _pending_entries, _pending_raw
+    if not _pending_entries and not _pending_raw:
+        return
+    entries, raw = _pending_entries, _pending_raw
+    _pending_entries, _pending_raw = {}, {}
+    try:
+        await _in_thread(_write, entries, raw)
+        _stats["written"] += len(entries) + len(raw)
+    except sqlite3.Error as e:
+        _stats["failed"] += len(entries) + len(raw)
+        logger.warning("Store write of %d rows failed: %s", len(entries) + len(raw), e)
+
+
+async def _run_writer():
+    while True:
+        await _wakeup.wait()
+        # Let writes pile up so one transaction carries many of them.
+        await asyncio.sleep(config.STORE_FLUSH_INTERVAL)
+        _wakeup.clear()
+        await _flush()
+
+
+def _schedule():
+    global _wakeup, _writer
+    if _writer is None:
+        _wakeup = asyncio.Event()
+        _writer = asyncio.get_running_loop().create_task(_run_writer())
+    _wakeup.set()
+
+
+def save_entry(key: str, body: bytes, meta: bytes, gz: bytes, br: bytes):
+    """Queue a cache entry's fields to be written."""
+    if not _disabled:
+        _pending_entries[key] = (body, meta, gz or b"", br or b"")
+        _schedule()
+
+
+def delete_entry(key: str):
+    """Queue the removal of an invalidated key, so it isn't restored later."""
+    if not _disabled:
+        _pending_entries[key] = None
+        _schedule()
+
+
+def save_raw(url: str, body: bytes, complete: bool = True):
+    """Queue an upstream body (complete=False: a prefix a streaming parser read)."""
+    if not _disabled and body:
+        _pending_raw[url] = (body, complete, time.time())
+        _schedule()
+
+
+async def load_entry(key: str) -> Optional[EntryRow]:
+    """The stored fields of a key, or None. Concurrent loads of a key share one read."""
+    if _disabled:
+        return None
+    if key in _pending_entries:
+        return _pending_entries[key]
+    future = _loading.get(key)
+    if future is None:
+        _stats["reads"] += 1
+        future = asyncio.ensure_future(_in_thread(_read_entry, key))
+        _loading[key] = future
+
+        def _done(f: asyncio.Future):
+            _loading.pop(key, None)
+            if not f.cancelled():
+                f.exception()  # mark retrieved; waiters handle it
+
+        future.add_done_callback(_done)
+    try:
+        row = await asyncio.shield(future)
+    except sqlite3.Error as e:
+        logger.warning("Store read of %s failed: %s", key, e)
+        return None
+    return row
+
+
+def store_stats() -> dict:
+    return {
+        "enabled": not _disabled,
+        "pending": len(_pending_entries) + len(_pending_raw),
+        **_stats,
+    }
+
+
+async def close_store():
+    """Write what is still queued and close the file."""
+    global _writer, _executor
+    if _writer is not None:
+        _writer.cancel()
+        try:
+            await _writer
+        except asyncio.CancelledError:
+            pass
+        _writer = None
+    if _executor is None:
+        return
+    await _flush()
+    await _in_thread(_close)
+    _executor.shutdown()
+    _executor = None
+
+
+def raw_bodies(
+    prefix: str = "", path: Optional[str] = None
+) -> Iterator[Tuple[str, bytes, bool, float]]:
+    """(url, body, complete, fetched_at) of stored upstream bodies, by URL prefix.
+
+    Synchronous, on its own read-only connection, for scripts that re-run a
+    parser over archived pages.
+    """
+    conn = sqlite3.connect(f"file:{path or config.STORE_PATH}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT url, body, complete, fetched_at FROM raw"
+            " WHERE substr(url, 1, ?) = ? ORDER BY url",
+            (len(prefix), prefix),
+        )
+        for url, body, complete, fetched_at in rows:
+            yield url, body, bool(complete), fetched_at
+    finally:
+        conn.close()
@@ -0,0 +1,217 @@
+"""
+Local title index for search-as-you-type.
+
+Movies seen in search results and in the now-showing/upcoming lists are
+indexed by word prefix and by trigram, so ``/search/suggest`` can answer most
+keystrokes without a quickbook-search round trip: prefix matches first, then
+typo-tolerant trigram matches. Only a query with no confident local answer
+goes upstream, and what comes back is indexed for the next keystroke.
+
+Each worker keeps its own index. New or renamed titles are also written to
+Redis, and workers pull what others added every few seconds, so a title
+seen by one worker soon suggests on all of them.
+"""
+
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+import orjson
+from app.core import config
+from app.services.cache import available_redis
+
+DOCS = "suggest:docs"  # hash: movie id -> doc JSON
+UPDATED = "suggest:updated"  # zset: movie id scored by time written
+
+_WORD = re.compile(r"\w+")
+_MAX_PREFIX = 12  # longer query words are verified against the full title
+_FIELDS = ("id", "name", "slug", "poster", "booking_url")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _trigrams(words: List[str]) -> Set[str]:
+    grams = set()
+    for word in words:
+        padded = f" {word} "
+        grams.update(map("".join, zip(padded, padded[1:], padded[2:])))
+    return grams
+
+
+class SuggestIndex:
+    """Prefix and trigram postings over movie names and slugs."""
+
+    def __init__(self):
+        self.docs: Dict[str, dict] = {}
+        self._words: Dict[str, Tuple[str, ...]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._trigram_ids: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc: dict) -> bool:
+        """Index or update a movie doc. Returns True if anything changed."""
+        doc_id = doc["id"]
+        if self.docs.get(doc_id) == doc:
+            return False
+        if doc_id not in self.docs and len(self.docs) >= config.SUGGEST_MAX_TITLES:
+            return False
+        words = tuple(dict.fromkeys(_words(doc["name"]) + _words(doc["slug"])))
+        if self._words.get(doc_id) != words:
+            self._unindex(doc_id)
+            self._index(doc_id, words)
+        self.docs[doc_id] = doc
+        return True
+
+    def _index(self, doc_id: str, words: Tuple[str, ...]):
+        self._words[doc_id] = words
+        for word in words:
+            for n in range(1, min(len(word), _MAX_PREFIX) + 1):
+                self._prefixes.setdefault(word[:n], set()).add(doc_id)
+        for gram in _trigrams(list(words)):
+            self._trigram_ids.setdefault(gram, set()).add(doc_id)
+
+    def _unindex(self, doc_id: str):
+        words = self._words.pop(doc_id, ())
+        for word in words:
+            for n in range(1, min(len(word), _MAX_PREFIX) + 1):
+                ids = self._prefixes.get(word[:n])
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self._prefixes[word[:n]]
+        for gram in _trigrams(list(words)):
+            ids = self._trigram_ids.get(gram)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._trigram_ids[gram]
+
+    def _prefix_matches(self, words: List[str]) -> List[Tuple[float, str]]:
+        postings = [self._prefixes.get(w[:_MAX_PREFIX]) for w in words]
+        if not all(postings):
+            return []
+        ids = set.intersection(*sorted(postings, key=len))
+        matches = []
+        for doc_id in ids:
+            title = self._words[doc_id]
+            if not all(any(t.startswith(w) for t in title) for w in words):
+                continue
+            # Titles that start with the query, then shorter titles, rank first.
+            score = 1.0 + (0.5 if title[0].startswith(words[0]) else 0.0)
+            matches.append((score - len(title) * 0.01, doc_id))
+        return matches
+
+    def _fuzzy_matches(
+        self, words: List[str], exclude: Set[str]
+    ) -> List[Tuple[float, str]]:
+        grams = _trigrams(words)
+        if not grams:
+            return []
+        overlap: Counter = Counter()
+        for gram in grams:
+            overlap.update(self._trigram_ids.get(gram, ()))
+        matches = []
+        for doc_id, shared in overlap.items():
+            if doc_id in exclude:
+                continue
+            # Share of the query's trigrams found in the title, so a typo'd
+            # prefix of a long title still scores well.
+            similarity = shared / len(grams)
+            if similarity >= config.SUGGEST_FUZZY_MIN:
+                matches.append((similarity, doc_id))
+        return matches
+
+    def search(self, query: str, limit: int) -> List[Tuple[float, dict]]:
+        """Best (score, doc) pairs for a query: prefix matches score above 1."""
+        words = _words(query)
+        if not words:
+            return []
+        matches = self._prefix_matches(words)
+        if len(matches) < limit:
+            matches += self._fuzzy_matches(words, {doc_id for _, doc_id in matches})
+        matches.sort(key=lambda m: (-m[0], self.docs[m[1]]["name"]))
+        return [(score, self.docs[doc_id]) for score, doc_id in matches[:limit]]
+
+
+_index = SuggestIndex()
+_synced_at = 0.0  # monotonic time of the last pull
+_synced_until = 0.0  # UPDATED score already pulled
+
+
+def as_doc(movie: dict) -> Optional[dict]:
+    """The suggestion fields of a movie from search results or a listing."""
+    if not movie.get("id") or not (movie.get("name") or movie.get("slug")):
+        return None
+    doc = {field: movie.get(field) or "" for field in _FIELDS}
+    if not doc["name"]:
+        doc["name"] = doc["slug"].replace("-", " ").title()
+    return doc
+
+
+async def add_movies(movies: List[dict], overwrite: bool = True):
+    """Index movies and share new ones with the other workers.
+
+    With overwrite False (titles derived from page slugs), movies already
+    known keep their existing name.
+    """
+    changed = []
+    for movie in movies:
+        doc = as_doc(movie)
+        if doc is None:
+            continue
+        known = _index.docs.get(doc["id"])
+        if known is not None and not overwrite:
+            doc = {**doc, "name": known["name"]}
+        if _index.add(doc):
+            changed.append(doc)
+    if not changed:
+        return
+    r = await available_redis()
+    if r is None:
+        return
+    now = time.time()
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.hset(DOCS, mapping={d["id"]: orjson.dumps(d) for d in changed})
+            pipe.zadd(UPDATED, {d["id"]: now for d in changed})
+            await pipe.execute()
+    except Exception:
+        pass
+
+
+async def _pull():
+    """Index titles other workers have added since the last pull."""
+    global _synced_at, _synced_until
+    if time.monotonic() - _synced_at < config.SUGGEST_SYNC_INTERVAL:
+        return
+    _synced_at = time.monotonic()
+    r = await available_redis()
+    if r is None:
+        return
+    try:
+        ids = await r.zrangebyscore(UPDATED, _synced_until, "+inf", withscores=True)
+        if not ids:
+            return
+        docs = await r.hmget(DOCS, [doc_id for doc_id, _ in ids])
+    except Exception:
+        return
+    for raw in docs:
+        if raw:
+            _index.add(orjson.loads(raw))
+    _synced_until = max(score for _, score in ids)
+
+
+async def lookup(query: str, limit: int) -> Tuple[List[Tuple[float, dict]], bool]:
+    """Local suggestions for a query and whether they are confident.
+
+    Confident means a prefix match, or a fuzzy match scoring at least
+    SUGGEST_CONFIDENT.
+    """
+    await _pull()
+    found = _index.search(query, limit)
+    confident = bool(found) and found[0][0] >= config.SUGGEST_CONFIDENT
+    return found, confident
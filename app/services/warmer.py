@@ -0,0 +1,166 @@
+"""
+Background cache warmer.
+
+One leader worker (elected through a Redis lease) periodically refreshes hot
+cache keys ahead of their TTL: the regions list, the registered per-region
+functions for the top cities, and whatever keys traffic shows to be popular.
+Every worker reports its per-key read counts so the hot set follows demand.
+"""
+
+import asyncio
+import logging
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+from app.core import config
+from app.services.cache import (
+    available_redis,
+    count_access,
+    drain_access_counts,
+    hold_lease,
+)
+
+logger = logging.getLogger(__name__)
+
+HOT_KEYS = "warmer:hot"
+LEADER_LEASE = "warmer:leader"
+HOT_DECAY = 0.9  # per tick, so old popularity fades
+HOT_MIN_SCORE = 0.5
+
+# key_prefix -> (cached function, kwarg name, region field that fills it)
+_targets: Dict[str, Tuple[Callable, str, Optional[str]]] = {}
+_region_source: Optional[Callable] = None
+_task: Optional[asyncio.Task] = None
+
+
+def register(func: Callable, region_field: Optional[str] = None, arg: str = "region"):
+    """Keep a ``cached`` function warm.
+
+    With region_field (``"slug"`` or ``"code"``) it is warmed for the top
+    cities, passing that field of each region as ``arg``; it is also warmed
+    for any of its keys that traffic makes hot.
+    """
+    _targets[func.key_prefix] = (func, arg, region_field)
+
+
+def register_region_source(func: Callable):
+    """Set the ``cached`` function that returns ``{"regions": [...]}``."""
+    global _region_source
+    _region_source = func
+
+
+def _jittered(seconds: float) -> float:
+    return seconds * (1 + random.uniform(-config.WARMER_JITTER, config.WARMER_JITTER))
+
+
+async def _report_access_counts():
+    counts = {
+        key: n
+        for key, n in drain_access_counts().items()
+        if ":" in key and key.partition(":")[0] in _targets
+    }
+    r = await available_redis()
+    if not counts or r is None:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for key, n in counts.items():
+                pipe.zincrby(HOT_KEYS, n, key)
+            await pipe.execute()
+    except Exception:
+        pass
+
+
+async def _hot_keys() -> List[str]:
+    r = await available_redis()
+    if r is None:
+        return []
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.zunionstore(HOT_KEYS, {HOT_KEYS: HOT_DECAY})
+            pipe.zremrangebyscore(HOT_KEYS, "-inf", HOT_MIN_SCORE)
+            pipe.zrevrange(HOT_KEYS, 0, config.WARMER_HOT_KEYS - 1)
+            *_, members = await pipe.execute()
+        return [m.decode() for m in members]
+    except Exception:
+        return []
+
+
+async def _plan() -> Dict[str, Tuple[Callable, dict]]:
+    """Work out which (function, kwargs) pairs to refresh this round."""
+    jobs: Dict[str, Tuple[Callable, dict]] = {}
+
+    regions = []
+    if _region_source is not None:
+        try:
+            await _region_source.refresh(ahead=config.WARMER_REFRESH_AHEAD)
+            regions = (await _region_source()).get("regions", [])
+        except Exception as e:
+            logger.warning("Cache warmer could not load regions: %s", e)
+
+    wanted = set(config.WARMER_REGIONS)
+    chosen = regions[: config.WARMER_TOP_CITIES] + [
+        r for r in regions if r.get("slug") in wanted or r.get("code") in wanted
+    ]
+    for prefix, (func, arg, field) in _targets.items():
+        if field is None:
+            continue
+        for region in chosen:
+            if region.get(field):
+                jobs[f"{prefix}:{region[field]}"] = (func, {arg: region[field]})
+
+    for key in await _hot_keys():
+        prefix, _, value = key.partition(":")
+        if prefix in _targets and key not in jobs:
+            func, arg, _ = _targets[prefix]
+            jobs[key] = (func, {arg: value})
+
+    return jobs
+
+
+async def _warm_once():
+    jobs = await _plan()
+    semaphore = asyncio.Semaphore(config.WARMER_CONCURRENCY)
+    spread = config.WARMER_INTERVAL * config.WARMER_JITTER
+
+    async def run(key: str, func: Callable, kwargs: dict):
+        await asyncio.sleep(random.uniform(0, spread))
+        async with semaphore:
+            try:
+                await func.refresh(ahead=config.WARMER_REFRESH_AHEAD, **kwargs)
+            except Exception as e:
+                logger.warning("Cache warmer failed to refresh %s: %s", key, e)
+
+    await asyncio.gather(*(run(k, f, kw) for k, (f, kw) in jobs.items()))
+
+
+async def _run():
+    while True:
+        try:
+            await _report_access_counts()
+            if await hold_lease(LEADER_LEASE, config.WARMER_INTERVAL * 3):
+                await _warm_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache warmer round failed")
+        await asyncio.sleep(_jittered(config.WARMER_INTERVAL))
+
+
+def start_warmer():
+    """Start the warmer loop on this worker (only the lease holder crawls)."""
+    global _task
+    if config.WARMER_ENABLED and _task is None:
+        count_access(True)
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_warmer():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+        count_access(False)
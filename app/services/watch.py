@@ -0,0 +1,308 @@
+"""
+Watch movie lists for changes and push them to subscribers.
+
+Clients subscribe to a region, optionally narrowed to some movies (by id or
+slug), over SSE or a WebSocket. For every region that has subscribers, one
+worker at a time (holding a Redis lease) polls the registered list functions
+every WATCH_INTERVAL by refreshing their cache entries, so the polling also
+keeps ``/now-showing`` and ``/upcoming`` fresh for everyone else. When a
+list's snapshot changes, the poller diffs it against the last one it saw and
+publishes ``added``/``removed`` events on Redis pub/sub; every worker
+delivers them to its own subscribers. Upstream load is one request per list
+and region per interval, however many clients are watching.
+
+The last seen movies of each list are kept in Redis, so a worker taking over
+a region's lease carries on from where the previous poller stopped. Without
+Redis every worker polls and delivers for its own subscribers.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import orjson
+from fastapi import HTTPException
+from app.core import config
+from app.services import regions
+from app.services.cache import available_redis, hold_lease
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "fdfs:watch:events"
+_SEEN_TTL = 86400  # seconds a region's last seen lists are kept
+
+# list name (the function's key prefix) -> cached function taking region=slug
+_lists: Dict[str, Callable] = {}
+_subscribers: Dict[str, Set["Subscription"]] = {}
+# (list name, region) -> (snapshot ETag, {movie id: movie})
+_seen: Dict[tuple, tuple] = {}
+_polling: Set[str] = set()  # regions this worker polled last round
+_tasks: List[asyncio.Task] = []
+
+
+def register(func: Callable):
+    """Watch a ``cached`` function returning ``{"movies": [...]}`` per region slug."""
+    _lists[func.key_prefix] = func
+
+
+class Subscription:
+    """One client's interest in a region, with its queue of pending events."""
+
+    __slots__ = ("region", "movies", "queue", "dropped")
+
+    def __init__(self, region: str, movies: Iterable[str]):
+        self.region = region
+        self.movies = {m.strip().lower() for m in movies if m.strip()}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=config.WATCH_QUEUE_SIZE)
+        self.dropped = False
+
+    def wants(self, movie: dict) -> bool:
+        if not self.movies:
+            return True
+        return (movie.get("id") or "").lower() in self.movies or (
+            movie.get("slug") or ""
+        ).lower() in self.movies
+
+    def put(self, event: dict):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: end the stream so the client resyncs.
+            self.dropped = True
+
+    async def next(self, timeout: float) -> Optional[dict]:
+        """The next event, or None if none arrived within timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def subscribe(region: str, movies: Iterable[str] = ()) -> Subscription:
+    """Start receiving events for a region (and movies, if given).
+
+    The region may be given in any form ``regions.slug`` resolves.
+    """
+    if sum(map(len, _subscribers.values())) >= config.WATCH_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many watchers; retry later.")
+    subscription = Subscription(regions.slug(region), movies)
+    _subscribers.setdefault(subscription.region, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription: Subscription):
+    subscribers = _subscribers.get(subscription.region)
+    if subscribers is not None:
+        subscribers.discard(subscription)
+        if not subscribers:
+            del _subscribers[subscription.region]
+
+
+async def snapshot(subscription: Subscription) -> dict:
+    """The subscribed movies currently in each list, as a ``snapshot`` event."""
+    found = {}
+    for name, func in _lists.items():
+        entry = await func.entry(region=subscription.region)
+        movies = entry.value.get("movies", [])
+        found[name] = [m for m in movies if subscription.wants(m)]
+        await _seed_seen(name, subscription.region, entry.etag, movies)
+    return {
+        "event": "snapshot",
+        "region": subscription.region,
+        "lists": found,
+        "at": time.time(),
+    }
+
+
+def _deliver(event: dict):
+    for subscription in list(_subscribers.get(event["region"], ())):
+        if subscription.wants(event["movie"]):
+            subscription.put(event)
+
+
+async def _publish(events: List[dict]):
+    """Send events to every worker's subscribers (or just ours without Redis)."""
+    r = await available_redis()
+    if r is not None:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.publish(EVENTS_CHANNEL, orjson.dumps(event))
+                await pipe.execute()
+            return
+        except Exception:
+            pass
+    for event in events:
+        _deliver(event)
+
+
+async def _listen():
+    """Deliver events published by pollers on any worker."""
+    while True:
+        r = await available_redis()
+        if r is None:
+            await asyncio.sleep(config.REDIS_BACKOFF)
+            continue
+        try:
+            async with r.pubsub() as pubsub:
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None:
+                        _deliver(orjson.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await asyncio.sleep(config.REDIS_BACKOFF)
+
+
+async def _load_seen(name: str, region: str) -> Optional[dict]:
+    """The movies a previous poller last saw in a list."""
+    r = await available_redis()
+    if r is None:
+        return None
+    try:
+        raw = await r.get(f"watch:seen:{name}:{region}")
+    except Exception:
+        return None
+    return orjson.loads(raw) if raw else None
+
+
+async def _store_seen(name: str, region: str, movies: dict):
+    r = await available_redis()
+    if r is None:
+        return
+    try:
+        await r.set(f"watch:seen:{name}:{region}", orjson.dumps(movies), ex=_SEEN_TTL)
+    except Exception:
+        pass
+
+
+async def _seed_seen(name: str, region: str, etag: str, movies: List[dict]):
+    """Make a snapshot sent to a subscriber the baseline of a list nobody polls yet.
+
+    Otherwise a change landing before the first poll would be folded into
+    that poll's baseline and never reported.
+    """
+    if (name, region) in _seen:
+        return
+    movies = _by_id(movies)
+    r = await available_redis()
+    if r is None:
+        _seen[(name, region)] = (etag, movies)
+        return
+    try:
+        key = f"watch:seen:{name}:{region}"
+        await r.set(key, orjson.dumps(movies), ex=_SEEN_TTL, nx=True)
+    except Exception:
+        pass
+
+
+def _by_id(movies: List[dict]) -> dict:
+    return {m["id"]: m for m in movies if m.get("id")}
+
+
+def _diff(name: str, region: str, before: dict, after: dict) -> List[dict]:
+    now = time.time()
+    events = [
+        {"event": "added", "list": name, "region": region, "movie": m, "at": now}
+        for movie_id, m in after.items()
+        if movie_id not in before
+    ]
+    events += [
+        {"event": "removed", "list": name, "region": region, "movie": m, "at": now}
+        for movie_id, m in before.items()
+        if movie_id not in after
+    ]
+    return events
+
+
+async def _poll_list(name: str, func: Callable, region: str) -> List[dict]:
+    """Refresh one list for a region and return what changed since last time."""
+    await func.refresh(region=region)  # ahead=0: always revalidate upstream
+    entry = await func.entry(region=region)
+    known = _seen.get((name, region))
+    if known is not None and known[0] == entry.etag:
+        return []
+
+    movies = _by_id(entry.value.get("movies", []))
+    # Redis has what the region's poller last saw, even if that wasn't us.
+    before = await _load_seen(name, region)
+    if before is None and known is not None:
+        before = known[1]
+    _seen[(name, region)] = (entry.etag, movies)
+    if before == movies:
+        return []
+    await _store_seen(name, region, movies)
+    # The first poll of a region only records a baseline.
+    return _diff(name, region, before, movies) if before is not None else []
+
+
+async def _poll_region(region: str):
+    r = await available_redis()
+    if r is not None and not await hold_lease(
+        f"watch:{region}", config.WATCH_INTERVAL * 3
+    ):
+        return  # another worker polls this region
+    _polling.add(region)
+    events = []
+    for name, func in _lists.items():
+        try:
+            events += await _poll_list(name, func, region)
+        except Exception as e:
+            logger.warning("Watcher could not poll %s for %s: %s", name, region, e)
+    if events:
+        await _publish(events)
+
+
+async def _run():
+    while True:
+        started = time.monotonic()
+        regions = list(_subscribers)
+        _polling.clear()
+        for key in [k for k in _seen if k[1] not in _subscribers]:
+            del _seen[key]
+        semaphore = asyncio.Semaphore(config.WATCH_CONCURRENCY)
+
+        async def run(region: str):
+            async with semaphore:
+                await _poll_region(region)
+
+        try:
+            await asyncio.gather(*map(run, regions))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Watcher round failed")
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(max(0.0, config.WATCH_INTERVAL - elapsed))
+
+
+def watch_stats() -> dict:
+    return {
+        "subscribers": sum(map(len, _subscribers.values())),
+        "regions": len(_subscribers),
+        "polling": len(_polling),
+    }
+
+
+def start_watcher():
+    """Start this worker's event listener and poller."""
+    if config.WATCH_ENABLED and not _tasks:
+        loop = asyncio.get_running_loop()
+        _tasks.extend([loop.create_task(_listen()), loop.create_task(_run())])
+
+
+async def stop_watcher():
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _tasks.clear()
@@ -0,0 +1,226 @@
+"""
+Microbenchmarks for the API's hot paths.
+
+Times the movie page parser, the venue and search transforms, nearby-theater
+queries and the overhead of the ``cached`` decorator (against an in-process
+fake Redis) on the recorded payloads in ``benchmarks/fixtures``.
+
+    python -m benchmarks.bench              # run and print results
+    python -m benchmarks.bench --save       # record benchmarks/baseline.json
+    python -m benchmarks.bench --check      # fail if a case got slower
+
+Timings are normalized by a fixed pure-Python calibration loop so baselines
+recorded on one machine remain comparable on another. The nearby-theater
+cases take numpy's vectorized path when it is installed (the ``geo`` extra)
+and a much slower loop otherwise; the committed baseline is recorded with
+numpy, and ``--check`` refuses a run made without it.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import orjson
+from fastapi import Request
+
+from app.routes.search import _map_hits
+from app.routes.theaters import _shape_theaters
+from app.services.geo import GeoIndex
+from app.services import cache, geo, store
+from app.services.scraper import parse_movies_from_html
+
+ROOT = Path(__file__).resolve().parent
+FIXTURES = ROOT / "fixtures"
+BASELINE = ROOT / "baseline.json"
+
+REPEAT = 7
+MIN_RUN_TIME = 0.05  # seconds per timed run
+DEFAULT_THRESHOLD = 1.3  # fail when normalized time grows by more than 30%
+
+
+def _fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+def _time(run: Callable[[int], None]) -> float:
+    """Best-of-REPEAT time for one call, in microseconds.
+
+    run(n) performs n calls; n is grown until a run takes MIN_RUN_TIME.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        run(number)
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_RUN_TIME:
+            break
+        number *= 2 if elapsed < MIN_RUN_TIME / 10 else 4
+    samples = [elapsed]
+    for _ in range(REPEAT - 1):
+        started = time.perf_counter()
+        run(number)
+        samples.append(time.perf_counter() - started)
+    return min(samples) / number * 1e6
+
+
+def _sync(func: Callable, *args) -> Callable[[int], None]:
+    def run(number: int):
+        for _ in range(number):
+            func(*args)
+
+    return run
+
+
+def _calibration():
+    # Dict/str/loop work similar in mix to the code under test.
+    seen = {}
+    for i in range(2000):
+        key = "k%d" % (i % 500)
+        seen[key] = seen.get(key, 0) + len(key)
+    return seen
+
+
+def _parser_cases() -> Dict[str, Callable[[int], None]]:
+    cases = {}
+    for shape in ("links", "paths", "jsonld"):
+        html = _fixture(f"explore_{shape}.html")
+        cases[f"parse_movies.{shape}"] = _sync(parse_movies_from_html, html, "t")
+    return cases
+
+
+def _transform_cases() -> Dict[str, Callable[[int], None]]:
+    small = _fixture("venues_small.json")
+    large = _fixture("venues_large.json")
+    venues = orjson.loads(large)["venues"]
+    xlarge = orjson.dumps({"venues": venues * 5})
+    hits = orjson.loads(_fixture("search_hits.json"))
+    index = GeoIndex(_shape_theaters(large, "HYD")["theaters"])
+    return {
+        "theaters.venues_40": _sync(_shape_theaters, small, "HYD"),
+        "theaters.venues_600": _sync(_shape_theaters, large, "HYD"),
+        "theaters.venues_3000": _sync(_shape_theaters, xlarge, "HYD"),
+        "theaters.nearby_600": _sync(index.query, 17.44, 78.39, 5.0, 20),
+        "search.map_hits": _sync(_map_hits, hits, "pushpa"),
+    }
+
+
+def _cache_cases() -> Dict[str, Callable[[int], None]]:
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError:
+        print("fakeredis not installed; skipping cache cases", file=sys.stderr)
+        return {}
+
+    loop = asyncio.new_event_loop()
+    cache._redis = FakeAsyncRedis()
+    store._disabled = True  # measure the cache, not last-known-good writes
+    payload = orjson.loads(_fixture("search_hits.json"))
+    misses = itertools.count()
+
+    @cache.cached("bench", ttl=300)
+    async def fetch(query: str):
+        return payload
+
+    def run_async(op: Callable, key: Optional[Callable[[], str]] = None):
+        async def batch(number: int):
+            for _ in range(number):
+                await op(query=key() if key else "hot")
+
+        return lambda number: loop.run_until_complete(batch(number))
+
+    async def redis_hit(query: str):
+        cache._l1_clear()
+        return await fetch(query=query)
+
+    request = Request(
+        {"type": "http", "headers": [(b"accept-encoding", b"gzip, deflate, br")]}
+    )
+
+    async def response(query: str):
+        return await fetch.response(request, query=query)
+
+    loop.run_until_complete(fetch(query="hot"))
+    return {
+        "cached.hit_l1": run_async(fetch),
+        "cached.hit_redis": run_async(redis_hit),
+        "cached.response_l1": run_async(response),
+        "cached.miss": run_async(fetch, key=lambda: f"miss-{next(misses)}"),
+    }
+
+
+def run_all(pattern: Optional[str] = None) -> dict:
+    cases = {}
+    for group in (_parser_cases, _transform_cases, _cache_cases):
+        cases.update(group())
+
+    timings = {
+        name: _time(run)
+        for name, run in cases.items()
+        if not pattern or pattern in name
+    }
+    # Best of three: a slow calibration would make every case look faster.
+    calibration = min(_time(_sync(_calibration)) for _ in range(3))
+
+    results = {}
+    for name, us in timings.items():
+        results[name] = {"us": round(us, 2), "norm": round(us / calibration, 6)}
+        print(f"{name:<28}{us:>12.1f} us{us / calibration:>10.3f} x")
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_us": round(calibration, 2),
+        "numpy": geo.np is not None,
+        "results": results,
+    }
+
+
+def check(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Names of cases whose normalized time exceeds baseline * threshold."""
+    failures = []
+    if current["numpy"] != baseline.get("numpy", current["numpy"]):
+        recorded = "with" if baseline["numpy"] else "without"
+        failures.append(f"baseline was recorded {recorded} numpy; install the same")
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before or not before["norm"]:
+            continue
+        ratio = now["norm"] / before["norm"]
+        if ratio > threshold:
+            failures.append(f"{name}: {ratio:.2f}x baseline")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", dest="pattern", help="only run cases containing this")
+    parser.add_argument("--save", action="store_true", help="write the baseline")
+    parser.add_argument("--check", action="store_true", help="compare to baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--json", type=Path, help="also write results here")
+    args = parser.parse_args(argv)
+
+    current = run_all(args.pattern)
+    if args.json:
+        args.json.write_text(json.dumps(current, indent=2) + "\n")
+    if args.save:
+        BASELINE.write_text(json.dumps(current, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE}")
+    if args.check:
+        baseline = json.loads(BASELINE.read_text())
+        failures = check(current, baseline, args.threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            return 1
+        print(f"No case slower than {args.threshold:.2f}x baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
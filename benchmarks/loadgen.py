@@ -0,0 +1,241 @@
+"""
+Open-loop load generator for the API.
+
+Sends requests at a fixed rate regardless of how fast responses come back (so
+a slow server shows up as latency, not as a politely lower request rate),
+with a skewed key mix: a few big cities and popular searches get most of the
+traffic, like production. Reports latency percentiles, throughput, the cache
+hit ratio (from ``X-Cache``) and, when pointed at the mock upstream, how many
+upstream calls the run caused.
+
+    python -m benchmarks.mock_upstream &
+    BMS_BASE_URL=http://127.0.0.1:9000 RATE_LIMIT=1000000/minute \\
+        uvicorn app.main:app --port 8000 &
+    python -m benchmarks.loadgen --rps 200 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import httpx
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# (weight, route): roughly the production mix
+ROUTES: List[Tuple[float, str]] = [
+    (0.35, "now-showing"),
+    (0.15, "upcoming"),
+    (0.25, "theaters"),
+    (0.20, "search"),
+    (0.05, "regions"),
+]
+
+
+def _zipf_weights(n: int, s: float) -> List[float]:
+    return [1.0 / (rank**s) for rank in range(1, n + 1)]
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class KeyMix:
+    """Picks request paths with Zipf-distributed regions and queries."""
+
+    def __init__(self, regions: List[dict], queries: List[str], skew: float):
+        self.regions = [r for r in regions if r.get("slug") and r.get("code")]
+        self.queries = queries
+        self.region_weights = _zipf_weights(len(self.regions), skew)
+        self.query_weights = _zipf_weights(len(queries), skew)
+        self.route_weights = [w for w, _ in ROUTES]
+
+    def next_path(self) -> Tuple[str, str]:
+        route = random.choices([r for _, r in ROUTES], self.route_weights)[0]
+        region = random.choices(self.regions, self.region_weights)[0]
+        if route in ("now-showing", "upcoming"):
+            return route, f"/{route}?region={region['slug']}"
+        if route == "theaters":
+            return route, f"/theaters?region={region['code']}"
+        if route == "search":
+            query = random.choices(self.queries, self.query_weights)[0]
+            return route, f"/search?q={query}"
+        return route, "/regions"
+
+
+def _default_queries() -> List[str]:
+    hits = json.loads((FIXTURES / "search_hits.json").read_text())["hits"]
+    titles = dict.fromkeys(h["GROUP_TITLE"].lower() for h in hits)
+    # Mostly prefixes, as typed into a search box.
+    return [t.split(" ")[0] for t in titles] + list(titles)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Counter = Counter()
+        self.cache: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record(self, route: str, seconds: float, status: int, cache: Optional[str]):
+        self.latencies.setdefault(route, []).append(seconds)
+        self.statuses[status] += 1
+        if cache:
+            self.cache[cache] += 1
+
+    def summary(self, elapsed: float, upstream: Optional[Dict[str, int]]) -> dict:
+        everything = sorted(x for v in self.latencies.values() for x in v)
+        lookups = sum(self.cache.values())
+        hits = self.cache["HIT"] + self.cache["STALE"]
+
+        def latency(values: List[float]) -> dict:
+            values = sorted(values)
+            return {
+                f"p{p}_ms": round(_percentile(values, p) * 1000, 2)
+                for p in (50, 95, 99)
+            }
+
+        return {
+            "requests": len(everything),
+            "throughput_rps": round(len(everything) / elapsed, 1),
+            "latency": latency(everything),
+            "latency_by_route": {r: latency(v) for r, v in self.latencies.items()},
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "cache": dict(self.cache),
+            "cache_hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "upstream_calls": upstream,
+        }
+
+
+async def _upstream_stats(
+    client: httpx.AsyncClient, url: Optional[str], reset: bool = False
+) -> Optional[Dict[str, int]]:
+    if not url:
+        return None
+    try:
+        if reset:
+            await client.post(f"{url}/__stats/reset")
+            return {}
+        return (await client.get(f"{url}/__stats")).json()
+    except httpx.HTTPError:
+        return None
+
+
+async def run(
+    base_url: str,
+    api_key: str,
+    rps: float,
+    duration: float,
+    skew: float,
+    upstream_url: Optional[str],
+    concurrency: int,
+) -> dict:
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    headers = {"X-API-Key": api_key}
+    stats = Stats()
+
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=30
+    ) as client:
+        regions = (await client.get("/regions")).json()["regions"]
+        mix = KeyMix(regions, _default_queries(), skew)
+        await _upstream_stats(client, upstream_url, reset=True)
+
+        async def one(route: str, path: str):
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+            except httpx.HTTPError as e:
+                stats.errors[type(e).__name__] += 1
+                return
+            stats.record(
+                route,
+                time.perf_counter() - started,
+                response.status_code,
+                response.headers.get("x-cache"),
+            )
+
+        tasks = set()
+        started = time.perf_counter()
+        total = int(rps * duration)
+        for i in range(total):
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(one(*mix.next_path()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - started
+
+        upstream = await _upstream_stats(client, upstream_url)
+    return stats.summary(elapsed, upstream)
+
+
+def _print(summary: dict):
+    latency = summary["latency"]
+    print(f"requests      {summary['requests']}  ({summary['throughput_rps']} req/s)")
+    print(
+        f"latency       p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms"
+        f"  p99 {latency['p99_ms']} ms"
+    )
+    for route, values in sorted(summary["latency_by_route"].items()):
+        print(f"  {route:<12}p50 {values['p50_ms']} ms  p99 {values['p99_ms']} ms")
+    print(f"statuses      {summary['statuses']}")
+    if summary["errors"]:
+        print(f"errors        {summary['errors']}")
+    print(f"cache         {summary['cache']}  hit ratio {summary['cache_hit_ratio']}")
+    if summary["upstream_calls"] is not None:
+        print(f"upstream      {summary['upstream_calls']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Open-loop load generator")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", default="dev-key-123")
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--concurrency", type=int, default=256, help="max connections")
+    parser.add_argument(
+        "--upstream",
+        default="http://127.0.0.1:9000",
+        help="mock upstream URL for call counts ('' to skip)",
+    )
+    parser.add_argument("--json", type=Path, help="also write the summary here")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    summary = asyncio.run(
+        run(
+            args.url,
+            args.api_key,
+            args.rps,
+            args.duration,
+            args.skew,
+            args.upstream or None,
+            args.concurrency,
+        )
+    )
+    _print(summary)
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
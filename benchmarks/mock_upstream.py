@@ -0,0 +1,160 @@
+"""
+Local stand-in for the BookMyShow endpoints the API calls.
+
+Serves the recorded payloads in ``benchmarks/fixtures`` with configurable
+latency, error rate and periodic 403 bursts (what Cloudflare does when it
+decides we are a bot), optionally with ETags and 304s, and counts every call
+so load tests can report how much upstream traffic the API generated.
+
+    python -m benchmarks.mock_upstream --port 9000 --latency 0.08
+    BMS_BASE_URL=http://127.0.0.1:9000 uvicorn app.main:app
+
+``GET /__stats`` returns the call counts; ``POST /__stats/reset`` clears them.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+class Faults:
+    """Latency and failure injection settings."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        burst_every: float = 0.0,
+        burst_length: float = 0.0,
+        validators: bool = False,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.validators = validators
+        self.started = time.monotonic()
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def blocked(self) -> bool:
+        """True during a 403 burst: the last burst_length of every burst_every."""
+        if self.burst_every <= 0:
+            return False
+        phase = (time.monotonic() - self.started) % self.burst_every
+        return phase >= self.burst_every - self.burst_length
+
+    def failed(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def create_app(faults: Optional[Faults] = None) -> FastAPI:
+    faults = faults or Faults()
+    payloads = {
+        "regions": (FIXTURES / "regions.json").read_bytes(),
+        "venues": (FIXTURES / "venues_large.json").read_bytes(),
+        "search": (FIXTURES / "search_hits.json").read_bytes(),
+        "explore": (FIXTURES / "explore_links.html").read_bytes(),
+    }
+    etags = {
+        family: f'"{hashlib.md5(body).hexdigest()}"'
+        for family, body in payloads.items()
+    }
+    calls: Counter = Counter()
+    app = FastAPI(title="BookMyShow stand-in", docs_url=None, redoc_url=None)
+
+    @app.middleware("http")
+    async def count_conditional(request: Request, call_next):
+        if "if-none-match" in request.headers:
+            calls["conditional"] += 1
+        return await call_next(request)
+
+    async def respond(family: str, media_type: str, request: Request) -> Response:
+        calls[family] += 1
+        await asyncio.sleep(faults.delay())
+        if faults.blocked():
+            calls[f"{family}.403"] += 1
+            return Response("Just a moment...", status_code=403, media_type="text/html")
+        if faults.failed():
+            calls[f"{family}.500"] += 1
+            return Response("Internal error", status_code=500)
+        if not faults.validators:
+            return Response(payloads[family], media_type=media_type)
+        headers = {"ETag": etags[family]}
+        if request.headers.get("if-none-match") == etags[family]:
+            calls[f"{family}.304"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(payloads[family], media_type=media_type, headers=headers)
+
+    @app.get("/api/explore/v1/discover/regions")
+    async def regions(request: Request):
+        return await respond("regions", "application/json", request)
+
+    @app.get("/api/v2/mobile/venues")
+    async def venues(request: Request, regionCode: str = "", eventType: str = ""):
+        return await respond("venues", "application/json", request)
+
+    @app.get("/quickbook-search.bms")
+    async def search(request: Request, q: str = "", cat: str = ""):
+        return await respond("search", "application/json", request)
+
+    @app.get("/explore/{page}")
+    async def explore(request: Request, page: str):
+        if not page.startswith(("movies-", "upcoming-movies-")):
+            return Response(status_code=404)
+        return await respond("explore", "text/html; charset=utf-8", request)
+
+    @app.get("/__stats")
+    async def stats():
+        return ORJSONResponse(dict(calls))
+
+    @app.post("/__stats/reset")
+    async def reset_stats():
+        calls.clear()
+        return ORJSONResponse({"ok": True})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local BookMyShow stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="+/- seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500s, 0-1")
+    parser.add_argument(
+        "--burst-every", type=float, default=0.0, help="seconds between 403 bursts"
+    )
+    parser.add_argument("--burst-length", type=float, default=0.0, help="seconds")
+    parser.add_argument(
+        "--validators", action="store_true", help="send ETags and answer 304s"
+    )
+    args = parser.parse_args()
+
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_length=args.burst_length,
+        validators=args.validators,
+    )
+    uvicorn.run(create_app(faults), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
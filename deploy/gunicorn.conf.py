@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for the API.
+
+Workers record Prometheus metrics into PROMETHEUS_MULTIPROC_DIR so /metrics
+reports all of them; the hooks below keep that directory consistent across
+restarts and worker exits.
+"""
+
+import os
+import shutil
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WORKERS", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be counted again.
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,133 +1,266 @@
 """
 MCP Server for BookMyShow API
 Exposes movie search, theaters, and showtimes as AI tools.
+
+Tools are answered by the same cached functions as the HTTP routes, so they
+share the Redis cache (and in-flight fetches) with the API workers. The MCP
+SDK runs each tool call in its own task, so independent calls proceed
+concurrently; ``lookup_many`` answers several in one call.
 """
 
 import asyncio
-import json
-from typing import Any
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+import orjson
+from fastapi import HTTPException
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
 from app.core import config
-from app.services.http_client import fetch_json, fetch_html
-from app.services.scraper import parse_movies_from_html
+from app.services import (
+    cache,
+    close_client,
+    close_pool,
+    close_redis,
+    close_store,
+    start_cache_listener,
+    start_pool,
+    start_region_index,
+    stop_region_index,
+)
+from app.routes.movies import _fetch_now_showing
+from app.routes.regions import _fetch_regions
+from app.routes.search import _search_movies
+from app.routes.theaters import _fetch_theaters
+
+logger = logging.getLogger(__name__)
 
 # Create MCP server
 app = Server("fdfs")
 
+_MAX_LIMIT = 200
+
+# Fields kept per item in compact output
+_COMPACT = {
+    "regions": ("code", "name", "slug"),
+    "movies": ("id", "name", "slug"),
+    "theaters": ("code", "name", "city"),
+}
+
+# tool -> (cached function, {tool argument: function argument}, list field, default limit)
+SOURCES: Dict[str, Tuple[Callable, Dict[str, str], str, int]] = {
+    "get_regions": (_fetch_regions, {}, "regions", 30),
+    "search_movies": (_search_movies, {"query": "query"}, "movies", 10),
+    "get_theaters": (_fetch_theaters, {"region_code": "region"}, "theaters", 20),
+    "get_now_showing": (_fetch_now_showing, {"region_slug": "region"}, "movies", 15),
+}
+
+_OUTPUT = {
+    "detail": {
+        "type": "string",
+        "enum": ["compact", "full"],
+        "description": "compact (default): a few key fields per item; full: every field",
+    },
+    "limit": {
+        "type": "integer",
+        "minimum": 1,
+        "maximum": _MAX_LIMIT,
+        "description": "Maximum items to return",
+    },
+}
+
+
+def _schema(properties: dict, required: List[str]) -> dict:
+    return {
+        "type": "object",
+        "properties": {**properties, **_OUTPUT},
+        "required": required,
+    }
+
+
 TOOLS = [
     Tool(
         name="get_regions",
         description="Get all BookMyShow regions/cities in India",
-        inputSchema={"type": "object", "properties": {}, "required": []},
+        inputSchema=_schema({}, []),
     ),
     Tool(
         name="search_movies",
         description="Search for movies by name",
-        inputSchema={
-            "type": "object",
-            "properties": {"query": {"type": "string", "description": "Movie name"}},
-            "required": ["query"],
-        },
+        inputSchema=_schema(
+            {"query": {"type": "string", "description": "Movie name"}}, ["query"]
+        ),
     ),
     Tool(
         name="get_theaters",
         description="Get theaters in a region",
-        inputSchema={
-            "type": "object",
-            "properties": {
+        inputSchema=_schema(
+            {
                 "region_code": {
                     "type": "string",
-                    "description": "Region code (HYD, MUMBAI)",
+                    "description": "Region code (HYD, MUMBAI); slugs and names work too",
                 }
             },
-            "required": ["region_code"],
-        },
+            ["region_code"],
+        ),
     ),
     Tool(
         name="get_now_showing",
         description="Get currently showing movies",
-        inputSchema={
-            "type": "object",
-            "properties": {
+        inputSchema=_schema(
+            {
                 "region_slug": {
                     "type": "string",
-                    "description": "Region slug (hyderabad)",
+                    "description": "Region slug (hyderabad); codes and names work too",
                 }
             },
-            "required": ["region_slug"],
+            ["region_slug"],
+        ),
+    ),
+    Tool(
+        name="lookup_many",
+        description=(
+            "Run several of the other tools in one call, e.g. now showing in "
+            "several regions or several searches. Results come back in order."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "calls": {
+                    "type": "array",
+                    "maxItems": config.BATCH_MAX_ITEMS,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "tool": {"type": "string", "enum": list(SOURCES)},
+                            "arguments": {
+                                "type": "object",
+                                "description": "The tool's arguments",
+                            },
+                        },
+                        "required": ["tool"],
+                    },
+                },
+                **_OUTPUT,
+            },
+            "required": ["calls"],
         },
     ),
 ]
 
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    return TOOLS
+def _resolve(name: str, arguments: dict) -> Tuple[Callable, dict]:
+    """The cached function and its kwargs for a tool call."""
+    if name not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown tool: {name}")
+    func, params, _, _ = SOURCES[name]
+    missing = [arg for arg in params if not arguments.get(arg)]
+    if missing:
+        raise HTTPException(
+            status_code=400, detail=f"Missing argument: {', '.join(missing)}"
+        )
+    return func, {kwarg: str(arguments[arg]) for arg, kwarg in params.items()}
 
 
-@app.call_tool()
-async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
-    handlers = {
-        "get_regions": _get_regions,
-        "search_movies": lambda: _search_movies(arguments.get("query", "")),
-        "get_theaters": lambda: _get_theaters(arguments.get("region_code", "")),
-        "get_now_showing": lambda: _get_now_showing(arguments.get("region_slug", "")),
-    }
+def _shape(name: str, value: dict, detail: str, limit: Any) -> dict:
+    """Trim a cached value to limit items, and to the compact fields if asked."""
+    field, default = SOURCES[name][2], SOURCES[name][3]
+    try:
+        limit = min(max(1, int(limit)), _MAX_LIMIT)
+    except (TypeError, ValueError):
+        limit = default
+    items = value.get(field, [])
+    if detail != "full":
+        keep = _COMPACT[field]
+        items = [{k: item.get(k) for k in keep} for item in items]
+    shaped = {k: v for k, v in value.items() if k != field}
+    shaped[field] = items[:limit]
+    shaped["count"] = len(items[:limit])
+    if len(items) > limit:
+        shaped["total"] = len(items)
+    return shaped
 
-    handler = handlers.get(name)
-    result = await handler() if handler else {"error": f"Unknown tool: {name}"}
 
-    return [TextContent(type="text", text=json.dumps(result, indent=2))]
+async def _call(name: str, arguments: dict, detail: str, limit: Any) -> dict:
+    try:
+        func, kwargs = _resolve(name, arguments)
+        return _shape(name, await func(**kwargs), detail, limit)
+    except HTTPException as e:
+        return {"error": e.detail}
+    except Exception:
+        # One failed item must not fail the rest of a lookup_many.
+        logger.exception("Tool %s failed", name)
+        return {"error": "Internal error"}
 
 
-async def _get_regions() -> dict:
-    url = f"{config.BMS_BASE_URL}/api/explore/v1/discover/regions"
-    data = await fetch_json(url)
-    regions = []
-    if "BookMyShow" in data:
-        for city in data["BookMyShow"].get("TopCities", [])[:30]:
-            regions.append(
-                {"code": city.get("RegionCode"), "name": city.get("RegionName")}
-            )
-    return {"regions": regions, "count": len(regions)}
+async def _lookup_many(calls: List[dict], detail: str, limit: Any) -> dict:
+    if len(calls) > config.BATCH_MAX_ITEMS:
+        return {"error": f"At most {config.BATCH_MAX_ITEMS} calls per lookup"}
+    calls = [c if isinstance(c, dict) else {} for c in calls]
 
+    # Everything already cached comes out of one pipelined round trip.
+    keys = []
+    for call in calls:
+        try:
+            func, kwargs = _resolve(call.get("tool", ""), call.get("arguments"))
+            keys.append(func.cache_key(**kwargs))
+        except (HTTPException, AttributeError):
+            pass
+    await cache.prefetch(keys)
+    semaphore = asyncio.Semaphore(config.BATCH_CONCURRENCY)
 
-async def _search_movies(query: str) -> dict:
-    from urllib.parse import quote
+    async def run(call: dict) -> dict:
+        name, arguments = call.get("tool", ""), call.get("arguments")
+        if not isinstance(arguments, dict):
+            arguments = {}
+        async with semaphore:
+            result = await _call(
+                name,
+                arguments,
+                arguments.get("detail", detail),
+                arguments.get("limit", limit),
+            )
+        return {"tool": name, **result}
 
-    url = f"{config.BMS_BASE_URL}/quickbook-search.bms?cat=MT&q={quote(query)}"
-    data = await fetch_json(url)
-    movies = [
-        {"name": h.get("TITLE"), "id": h.get("ID")}
-        for h in data.get("hits", [])[:10]
-        if h.get("TYPE") == "MT"
-    ]
-    return {"movies": movies, "query": query}
+    results = await asyncio.gather(*map(run, calls))
+    return {"results": results, "count": len(results)}
 
 
-async def _get_theaters(region_code: str) -> dict:
-    url = f"{config.BMS_BASE_URL}/api/v2/mobile/venues"
-    data = await fetch_json(url, params={"regionCode": region_code, "eventType": "MT"})
-    theaters = [
-        {"name": v.get("VenueName"), "code": v.get("VenueCode")}
-        for v in data.get("venues", [])[:20]
-    ]
-    return {"theaters": theaters, "region": region_code}
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    return TOOLS
+
 
+@app.call_tool()
+async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+    arguments = arguments or {}
+    detail = arguments.get("detail", "compact")
+    limit = arguments.get("limit")
+    if name == "lookup_many":
+        result = await _lookup_many(arguments.get("calls") or [], detail, limit)
+    else:
+        result = await _call(name, arguments, detail, limit)
 
-async def _get_now_showing(region_slug: str) -> dict:
-    url = f"{config.BMS_BASE_URL}/{region_slug}/movies"
-    html = await fetch_html(url)
-    movies = parse_movies_from_html(html, "now_showing")[:15]
-    return {"movies": movies, "region": region_slug}
+    # Compact JSON: indentation only costs the model tokens.
+    return [TextContent(type="text", text=orjson.dumps(result).decode())]
 
 
 async def main():
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, app.create_initialization_options())
+    start_pool()
+    start_cache_listener()
+    start_region_index()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream, write_stream, app.create_initialization_options()
+            )
+    finally:
+        await stop_region_index()
+        await close_client()
+        await close_pool()
+        await close_store()
+        await close_redis()
 
 
 if __name__ == "__main__":